@@ -2,52 +2,145 @@ from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from app.database import get_user_collection
-from bson import ObjectId
+from app.database import get_user_collection, get_async_user_collection, build_id_query, add_memory_store_listener
+from app.cache import TTLCache
+from app.revocation import revocations
 import os
+import time
+import uuid
 
 # Replace this with a secure, random string in production
 SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+# Resolved user records by user_id. Changes made through this process drop
+# the entry (invalidate_cached_user); the TTL bounds how stale a record
+# changed elsewhere can get.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# Verified token -> its claims, kept until the token's exp (at most
+# TOKEN_CACHE_MAX_TTL_SECONDS). Revocation is still checked on every request.
+TOKEN_CACHE_MAX_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_MAX_TTL_SECONDS", "3600"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+token_cache = TTLCache(TOKEN_CACHE_MAX_ENTRIES, TOKEN_CACHE_MAX_TTL_SECONDS)
+# Time spent resolving a token to a user: [count, total seconds] by outcome
+_resolve_timings = {"cached": [0, 0.0], "loaded": [0, 0.0]}
+
+def invalidate_cached_user(user_id: str):
+    """Call after changing a user document"""
+    user_cache.invalidate(str(user_id))
+
+def _on_user_change(collection_name: str, op: str, doc: dict):
+    # The in-memory store reports every write, so its users never go stale
+    if collection_name == "users":
+        invalidate_cached_user(doc["_id"])
+
+add_memory_store_listener(_on_user_change)
+
+def _record_resolve(outcome: str, started: float):
+    timing = _resolve_timings[outcome]
+    timing[0] += 1
+    timing[1] += time.perf_counter() - started
+
+def auth_cache_stats() -> dict:
+    """User/token cache counters and average token resolution time"""
+    return {
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+        "revocations": revocations.stats(),
+        "resolve_avg_us": {
+            outcome: round(total / count * 1e6, 1) if count else None
+            for outcome, (count, total) in _resolve_timings.items()
+        },
+    }
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({
         "exp": expire,
+        "iat": time.time(),  # fractional, so logout-all can't catch a token issued the same second
+        "jti": uuid.uuid4().hex,  # identifies this token for revocation
         "sub": data["email"]  # or use "_id" if preferred
     })
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_claims(token: str) -> dict:
+    """Verify a token and return the claims auth relies on (user_id, jti, iat, exp)"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    for claim in ("user_id", "jti", "iat", "exp"):
+        # Tokens minted before revocation existed have no jti or exp
+        if payload.get(claim) is None:
+            raise HTTPException(status_code=401, detail=f"Invalid token: missing {claim}")
+    claims = {claim: payload[claim] for claim in ("user_id", "jti", "iat", "exp")}
+    token_cache.put(token, claims, claims["exp"] - time.time())
+    return claims
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
+    started = time.perf_counter()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        user_email = payload.get("email")
-        
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token: missing user_id")
-
+        claims = token_claims(token)
+        if revocations.is_revoked(claims):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        user_id = claims["user_id"]
+        user = user_cache.get(user_id)
+        if user is not None:
+            _record_resolve("cached", started)
+            return dict(user)
         users_collection = get_user_collection()
-        
-        # Handle both MongoDB ObjectId and mock string IDs
-        if user_id.startswith("mock_id_"):
-            user = users_collection.find_one({"_id": user_id})
-        else:
-            try:
-                user = users_collection.find_one({"_id": ObjectId(user_id)})
-            except:
-                user = users_collection.find_one({"_id": user_id})
-                
+
+        # Handles both MongoDB ObjectId and mock string IDs
+        user = users_collection.find_one(build_id_query(user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         user["_id"] = str(user["_id"])  # Convert ObjectId to string
-        return user
+        user_cache.put(user_id, user)
+        _record_resolve("loaded", started)
+        return dict(user)
+    except HTTPException:
+        raise
+    except JWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme)):
+    return await user_for_token_async(token)
+
+async def user_for_token_async(token: str):
+    """Resolve a bearer token to its user, for callers that don't take it from the header"""
+    started = time.perf_counter()
+    try:
+        claims = token_claims(token)
+        if await revocations.is_revoked_async(claims):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        user_id = claims["user_id"]
+        user = user_cache.get(user_id)
+        if user is not None:
+            _record_resolve("cached", started)
+            return dict(user)
+        users_collection = await get_async_user_collection()
+
+        user = await users_collection.find_one(build_id_query(user_id))
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        user["_id"] = str(user["_id"])
+        user_cache.put(user_id, user)
+        _record_resolve("loaded", started)
+        return dict(user)
+    except HTTPException:
+        raise
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
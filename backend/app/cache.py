@@ -0,0 +1,155 @@
+"""
+In-process caches: ListCache for the per-user task and label lists, and
+TTLCache for small lookups (resolved users and verified token claims, see
+app/auth.py).
+
+ListCache entries hold the JSON response body, so a hit skips the database read, the
+dict building and the serialization. Each entry records the data version
+(app/versions.py) it was built from, and a lookup only hits if that is
+still the user's current version for the list. Writes therefore invalidate
+exactly the lists they touch. A read that raced with a write cannot store
+a stale body: put() refuses a body built from a version that has already
+moved on.
+
+The cache is an LRU over all users, capped by the total size of the cached
+bodies (LIST_CACHE_MAX_BYTES, 0 disables it).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.versions import current_version
+
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ListCache:
+    def __init__(self, max_bytes: int = LIST_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # (user_id, resource, variant) -> (version, body)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[int, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, resource: str, variant: str = "") -> Optional[bytes]:
+        key = (user_id, resource, variant)
+        version = current_version(user_id, resource)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                # Written since it was cached
+                self._drop(key)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, resource: str, variant: str, version: int, body: bytes):
+        """Cache a body built from data at ``version`` (read before the query ran)"""
+        # One list may not take more than an eighth of the cache
+        if len(body) > self.max_bytes // 8 or version != current_version(user_id, resource):
+            return
+        key = (user_id, resource, variant)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self._size -= len(self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+list_cache = ListCache()
+
+
+class TTLCache:
+    """LRU cache with a per-entry deadline and an entry-count cap"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at on the monotonic clock, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """The cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Cache a value for ttl_seconds (capped at the cache's own TTL)"""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -1,10 +1,27 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import os
+import asyncio
+import logging
+import atexit
+import time
+from datetime import datetime
 import bcrypt
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any, Optional, Set
 import json
 from dotenv import load_dotenv
+from app.memory_store import MockCollection, AsyncMockCollection
+from app.persistence import MemoryStoreJournal
+from app.indexes import ensure_indexes
+from app.versions import bump_version, current_version, invalidate_all
+from app.cache import list_cache
+from app.serialization import dumps
+from app.instrumentation import instrument, set_explain_source
+from models.task_model import parse_deadline
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 
@@ -12,12 +29,24 @@ load_dotenv()
 # Get MongoDB URI from environment or use default
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 
-# In-memory storage as fallback
-in_memory_storage = {
-    "users": [],
-    "tasks": [],
-    "labels": []
-}
+# In-memory storage as fallback (collection name -> MockCollection)
+in_memory_storage: Dict[str, MockCollection] = {}
+# Change listeners for the in-memory collections, including ones created later
+memory_store_listeners: List[Callable] = []
+
+# Set MEMORY_STORE_DIR to keep the in-memory fallback across restarts
+# (operation log + periodic snapshots, see app/persistence.py)
+MEMORY_STORE_DIR = os.getenv("MEMORY_STORE_DIR")
+MEMORY_STORE_SYNC_COMMIT = os.getenv("MEMORY_STORE_SYNC_COMMIT", "false").lower() == "true"
+memory_store_journal = None
+
+# How often the background monitor checks MongoDB, and how many failed
+# checks in a row make the process fail over to the in-memory store
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "5"))
+DB_FAILOVER_THRESHOLD = int(os.getenv("DB_FAILOVER_THRESHOLD", "3"))
+# Time given to in-flight requests on the old store before the final
+# migration pass when failing back to MongoDB
+DB_FAILBACK_GRACE_SECONDS = float(os.getenv("DB_FAILBACK_GRACE_SECONDS", "1"))
 
 # Global variables for lazy initialization
 client = None
@@ -25,74 +54,335 @@ db = None
 users_collection = None
 tasks_collection = None
 labels_collection = None
+tombstones_collection = None
+revocations_collection = None
 USE_MONGODB = None
 
+# Async (Motor) counterparts, used by the async def routes
+async_client = None
+async_users_collection = None
+async_tasks_collection = None
+async_labels_collection = None
+async_tombstones_collection = None
+async_revocations_collection = None
+_async_init_lock = asyncio.Lock()
+_health_monitor_task = None
+
+def _connect_mongodb() -> MongoClient:
+    """Open a MongoDB client and make sure the server answers"""
+    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)  # Reduced to 1 second
+    try:
+        mongo_client.server_info()
+    except Exception:
+        mongo_client.close()
+        raise
+    return mongo_client
+
+def _migrate_string_deadlines(target_db):
+    """Store task deadlines saved as strings (by PUT before it parsed them) as datetimes.
+
+    Pagination and deadline filters compare datetimes, which MongoDB never
+    matches against strings. Runs once per database; a deadline that does
+    not parse stays a string and sorts before all dates, where cursors
+    (see task_db.encode_cursor) still page through it.
+    """
+    migrations = target_db["schema_migrations"]
+    if migrations.find_one({"_id": "string_deadlines"}) is not None:
+        return
+    requests = []
+    for task in target_db["tasks"].find({"deadline": {"$type": "string"}}, {"deadline": 1}):
+        try:
+            deadline = parse_deadline(task["deadline"])
+        except ValueError:
+            continue
+        # Matched on the old value too, in case a request changed it meanwhile
+        requests.append(UpdateOne({"_id": task["_id"], "deadline": task["deadline"]}, {"$set": {"deadline": deadline}}))
+    if requests:
+        target_db["tasks"].bulk_write(requests, ordered=False)
+        logger.info("Converted string task deadlines to dates", extra={"converted": len(requests)})
+    migrations.insert_one({"_id": "string_deadlines", "converted": len(requests), "at": datetime.utcnow()})
+
+def _invalidate_cached_lists():
+    """Cached list bodies and ETags describe the other store's data; drop them"""
+    invalidate_all()
+    list_cache.clear()
+
+def _use_mongodb(mongo_client: MongoClient):
+    """Point the sync and async collection globals at MongoDB"""
+    global client, db, users_collection, tasks_collection, labels_collection, tombstones_collection, revocations_collection, USE_MONGODB
+    global async_client, async_users_collection, async_tasks_collection, async_labels_collection, async_tombstones_collection
+    global async_revocations_collection
+
+    # Make sure the hot query shapes are indexed before serving from MongoDB
+    ensure_indexes(mongo_client["todo_app"])
+    try:
+        _migrate_string_deadlines(mongo_client["todo_app"])
+    except Exception as e:
+        logger.warning("Could not convert string task deadlines", extra={"error": str(e)})
+
+    old_client, old_async_client = client, async_client
+    client = mongo_client
+    db = client["todo_app"]
+    # Motor binds to the running event loop lazily, so this is safe to
+    # create from a worker thread
+    async_client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    async_db = async_client["todo_app"]
+
+    users_collection = instrument(db["users"], "users")
+    tasks_collection = instrument(db["tasks"], "tasks")
+    labels_collection = instrument(db["labels"], "labels")
+    tombstones_collection = instrument(db["task_tombstones"], "task_tombstones")
+    revocations_collection = instrument(db["revoked_tokens"], "revoked_tokens")
+    async_users_collection = instrument(async_db["users"], "users")
+    async_tasks_collection = instrument(async_db["tasks"], "tasks")
+    async_labels_collection = instrument(async_db["labels"], "labels")
+    async_tombstones_collection = instrument(async_db["task_tombstones"], "task_tombstones")
+    async_revocations_collection = instrument(async_db["revoked_tokens"], "revoked_tokens")
+    set_explain_source(lambda name: db[name])
+    USE_MONGODB = True
+    _invalidate_cached_lists()
+
+    for stale in (old_client, old_async_client):
+        if stale is not None and stale is not client:
+            stale.close()
+
+def _use_memory_store():
+    """Point the sync and async collection globals at the in-memory fallback"""
+    global users_collection, tasks_collection, labels_collection, tombstones_collection, revocations_collection
+    global USE_MONGODB, memory_store_journal
+    global async_users_collection, async_tasks_collection, async_labels_collection, async_tombstones_collection
+    global async_revocations_collection
+
+    if not in_memory_storage:
+        # Mock collections that behave like MongoDB collections, with hash
+        # indexes on the fields our queries filter by. Tasks and labels are
+        # sharded per user so concurrent requests from different users
+        # never share a lock.
+        in_memory_storage["users"] = MockCollection("users", indexes=("email",))
+        in_memory_storage["tasks"] = MockCollection("tasks", indexes=(), shard_key="user_id", order_by="deadline")
+        in_memory_storage["labels"] = MockCollection("labels", indexes=(), shard_key="user_id")
+        in_memory_storage["task_tombstones"] = MockCollection("task_tombstones", indexes=(), shard_key="user_id")
+        in_memory_storage["revoked_tokens"] = MockCollection("revoked_tokens", indexes=("key",))
+        for collection in in_memory_storage.values():
+            for listener in memory_store_listeners:
+                collection.add_listener(listener)
+
+        if MEMORY_STORE_DIR:
+            memory_store_journal = MemoryStoreJournal(MEMORY_STORE_DIR, sync_commit=MEMORY_STORE_SYNC_COMMIT)
+            memory_store_journal.attach(in_memory_storage)
+            atexit.register(memory_store_journal.close)
+            logger.info("In-memory storage is persisted", extra={"directory": MEMORY_STORE_DIR})
+
+    users_collection = instrument(in_memory_storage["users"], "users")
+    tasks_collection = instrument(in_memory_storage["tasks"], "tasks")
+    labels_collection = instrument(in_memory_storage["labels"], "labels")
+    tombstones_collection = instrument(in_memory_storage["task_tombstones"], "task_tombstones")
+    revocations_collection = instrument(in_memory_storage["revoked_tokens"], "revoked_tokens")
+    async_users_collection = instrument(AsyncMockCollection(in_memory_storage["users"]), "users")
+    async_tasks_collection = instrument(AsyncMockCollection(in_memory_storage["tasks"]), "tasks")
+    async_labels_collection = instrument(AsyncMockCollection(in_memory_storage["labels"]), "labels")
+    async_tombstones_collection = instrument(AsyncMockCollection(in_memory_storage["task_tombstones"]), "task_tombstones")
+    async_revocations_collection = instrument(AsyncMockCollection(in_memory_storage["revoked_tokens"]), "revoked_tokens")
+    set_explain_source(None)
+    USE_MONGODB = False
+    _invalidate_cached_lists()
+
 def _initialize_database():
     """Initialize database connection lazily"""
-    global client, db, users_collection, tasks_collection, labels_collection, USE_MONGODB
-    
     if USE_MONGODB is not None:
         return  # Already initialized
-    
+
     # Try to connect to MongoDB with shorter timeout
     try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)  # Reduced to 1 second
-        # Test connection
-        client.server_info()
-        db = client["todo_app"]
-        users_collection = db["users"]
-        tasks_collection = db["tasks"]
-        labels_collection = db["labels"]
-        USE_MONGODB = True
-        print("Connected to MongoDB successfully")
+        _use_mongodb(_connect_mongodb())
+        logger.info("Connected to MongoDB successfully")
+    except Exception as e:
+        logger.warning("MongoDB connection failed; using in-memory storage as fallback", extra={"error": str(e)})
+        _use_memory_store()
+
+async def _initialize_async_database():
+    """Initialize the async collections lazily, mirroring _initialize_database"""
+    if async_tasks_collection is not None:
+        return  # Already initialized
+
+    async with _async_init_lock:
+        # Decide between MongoDB and the fallback without blocking the event loop
+        if USE_MONGODB is None:
+            await asyncio.to_thread(_initialize_database)
+
+def add_memory_store_listener(listener: Callable):
+    """Subscribe to writes on the in-memory collections (see MockCollection.add_listener)"""
+    memory_store_listeners.append(listener)
+    for collection in in_memory_storage.values():
+        collection.add_listener(listener)
+
+def remove_memory_store_listener(listener: Callable):
+    if listener in memory_store_listeners:
+        memory_store_listeners.remove(listener)
+    for collection in in_memory_storage.values():
+        collection.remove_listener(listener)
+
+# Failover / failback
+# Collections whose documents belong to a user through their user_id
+USER_OWNED_COLLECTIONS = ("tasks", "labels", "task_tombstones")
+
+def _resolve_user_conflicts(target_db, docs: List[dict], error: BulkWriteError, user_ids: Dict[str, str]):
+    """Map in-memory users refused by MongoDB to the existing user with their email.
+
+    A user who signed up on both sides keeps one account: their buffered
+    tasks and labels move to the MongoDB user instead of being left without
+    an owner. Raises if a refused user has no such counterpart.
+    """
+    for write_error in error.details.get("writeErrors", []):
+        doc = docs[write_error["index"]]
+        existing = None
+        if write_error.get("code") == 11000 and doc.get("email"):
+            existing = target_db["users"].find_one({"email": doc["email"]}, {"_id": 1})
+        if existing is None:
+            raise RuntimeError(f"user {doc['_id']} could not be migrated: {write_error.get('errmsg')}")
+        user_ids[str(doc["_id"])] = str(existing["_id"])
+        logger.warning("In-memory user merged into the MongoDB user with the same email",
+                       extra={"user_id": str(doc["_id"]), "merged_into": str(existing["_id"])})
+
+def _migrate_memory_store(target_db, changed: Optional[Dict[str, Set[Any]]] = None,
+                          user_ids: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Upsert buffered in-memory documents into MongoDB, keeping _ids.
+
+    Copies every document, or with `changed` only those _ids (deleting the
+    ones no longer in memory). Users go first, so conflicting ones are
+    mapped to their MongoDB account (see _resolve_user_conflicts) before
+    their documents are copied. Returns that mapping, extending `user_ids`.
+    """
+    user_ids = dict(user_ids or {})
+    for name, collection in in_memory_storage.items():
+        removed = []
+        if changed is None:
+            docs = list(collection._iter_docs())
+        else:
+            docs = []
+            for doc_id in changed.get(name, ()):
+                doc = collection.find_one({"_id": doc_id})
+                if doc is None:
+                    removed.append(doc_id)
+                else:
+                    docs.append(doc)
+        if name in USER_OWNED_COLLECTIONS and user_ids:
+            for doc in docs:
+                if doc.get("user_id") in user_ids:
+                    doc["user_id"] = user_ids[doc["user_id"]]
+        if removed:
+            target_db[name].delete_many({"_id": {"$in": removed}})
+        if not docs:
+            continue
+        try:
+            target_db[name].bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            if name == "users":
+                _resolve_user_conflicts(target_db, docs, e, user_ids)
+            else:
+                logger.warning("Skipped conflicting documents during failback",
+                               extra={"collection": name, "skipped": len(e.details.get("writeErrors", []))})
+    return user_ids
+
+def _fail_back_to_mongodb(mongo_client: MongoClient):
+    """Promote the process from the in-memory store to MongoDB.
+
+    Runs in a worker thread. The first pass copies the buffered documents
+    while the fallback still serves traffic; if it fails, nothing has been
+    switched and the next health check tries again. After the switch, a
+    second pass copies only the documents written to the fallback since the
+    first pass started (requests that raced with it), so edits already made
+    in MongoDB are not overwritten by unchanged in-memory copies. Then the
+    fallback is emptied.
+    """
+    target_db = mongo_client["todo_app"]
+    changed: Dict[str, Set[Any]] = {}
+
+    def track(collection_name: str, op: str, doc: Dict[str, Any]):
+        changed.setdefault(collection_name, set()).add(doc["_id"])
+
+    add_memory_store_listener(track)
+    try:
+        user_ids = _migrate_memory_store(target_db)
+        _use_mongodb(mongo_client)
+        time.sleep(DB_FAILBACK_GRACE_SECONDS)
+    finally:
+        remove_memory_store_listener(track)
+    _migrate_memory_store(target_db, {name: set(ids) for name, ids in list(changed.items())}, user_ids)
+
+    moved = sum(collection.count_documents({}) for collection in in_memory_storage.values())
+    for collection in in_memory_storage.values():
+        collection.delete_many({})
+    # The second pass wrote to MongoDB behind the versions' back
+    _invalidate_cached_lists()
+    logger.info("MongoDB is reachable again; switched back", extra={"migrated": moved})
+
+async def _check_database_health(failures: int) -> int:
+    """Run one health check; returns the updated consecutive-failure count"""
+    if USE_MONGODB:
+        try:
+            await async_client.admin.command("ping")
+            return 0
+        except Exception as e:
+            failures += 1
+            if failures >= DB_FAILOVER_THRESHOLD:
+                logger.error("MongoDB unreachable; failing over to in-memory storage", extra={"error": str(e)})
+                await asyncio.to_thread(_use_memory_store)
+                return 0
+            return failures
+
+    try:
+        mongo_client = await asyncio.to_thread(_connect_mongodb)
+    except Exception:
+        return 0
+    try:
+        await asyncio.to_thread(_fail_back_to_mongodb, mongo_client)
     except Exception as e:
-        print(f"MongoDB connection failed: {e}")
-        print("Using in-memory storage as fallback")
-        USE_MONGODB = False
-        
-        # Create mock collections that behave like MongoDB collections
-        class MockCollection:
-            def __init__(self, collection_name: str):
-                self.collection_name = collection_name
-                self.data = in_memory_storage[collection_name]
-                self._counter = 0
-            
-            def insert_one(self, document: Dict[str, Any]) -> Any:
-                self._counter += 1
-                doc_id = f"mock_id_{self._counter}"
-                document["_id"] = doc_id
-                self.data.append(document)
-                return type('Result', (), {'inserted_id': doc_id})()
-            
-            def find_one(self, query: Dict[str, Any]) -> Any:
-                for doc in self.data:
-                    if all(doc.get(k) == v for k, v in query.items()):
-                        return doc
-                return None
-            
-            def find(self, query: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-                if query is None:
-                    return self.data.copy()
-                return [doc for doc in self.data if all(doc.get(k) == v for k, v in query.items())]
-            
-            def update_one(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
-                for i, doc in enumerate(self.data):
-                    if all(doc.get(k) == v for k, v in query.items()):
-                        if "$set" in update:
-                            self.data[i].update(update["$set"])
-                        return type('Result', (), {'modified_count': 1})()
-                return type('Result', (), {'modified_count': 0})()
-            
-            def delete_one(self, query: Dict[str, Any]) -> Any:
-                for i, doc in enumerate(self.data):
-                    if all(doc.get(k) == v for k, v in query.items()):
-                        del self.data[i]
-                        return type('Result', (), {'deleted_count': 1})()
-                return type('Result', (), {'deleted_count': 0})()
-        
-        users_collection = MockCollection("users")
-        tasks_collection = MockCollection("tasks")
-        labels_collection = MockCollection("labels")
+        logger.warning("Failback to MongoDB aborted", extra={"error": str(e)})
+        if client is not mongo_client:
+            mongo_client.close()
+    return 0
+
+async def _health_monitor():
+    failures = 0
+    while True:
+        await asyncio.sleep(DB_HEALTH_CHECK_INTERVAL)
+        try:
+            failures = await _check_database_health(failures)
+        except Exception:
+            logger.exception("Database health check failed")
+
+async def startup_database():
+    """Connect eagerly at startup and start the background health monitor"""
+    global _health_monitor_task
+    await _initialize_async_database()
+    if _health_monitor_task is None and DB_HEALTH_CHECK_INTERVAL > 0:
+        _health_monitor_task = asyncio.create_task(_health_monitor())
+
+async def shutdown_database():
+    """Stop the health monitor and flush the in-memory journal"""
+    global _health_monitor_task
+    if _health_monitor_task is not None:
+        _health_monitor_task.cancel()
+        try:
+            await _health_monitor_task
+        except asyncio.CancelledError:
+            pass
+        _health_monitor_task = None
+    if memory_store_journal is not None:
+        await asyncio.to_thread(memory_store_journal.close)
+
+def build_id_query(doc_id: str) -> dict:
+    """Build an _id query for either a MongoDB ObjectId or a mock string ID"""
+    if doc_id.startswith("mock_id_"):
+        return {"_id": doc_id}
+    try:
+        return {"_id": ObjectId(doc_id)}
+    except Exception:
+        return {"_id": doc_id}
 
 # User functions
 def create_user(username: str, email: str, password: str):
@@ -113,30 +403,64 @@ def find_user_by_email(email: str):
 def verify_password(plain_password: str, hashed_password: bytes):
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
 
-# Label functions
-def create_label(label_data: dict, user_id: str):
-    _initialize_database()
+# Async label functions
+async def create_label_async(label_data: dict, user_id: str):
+    await _initialize_async_database()
     label_data["user_id"] = user_id
-    result = labels_collection.insert_one(label_data)
+    result = await async_labels_collection.insert_one(label_data)
+    bump_version(user_id, "labels")
     return str(result.inserted_id)
 
-def get_labels(user_id: str):
-    _initialize_database()
-    labels = labels_collection.find({"user_id": user_id})
+async def get_labels_async(user_id: str):
+    await _initialize_async_database()
+    labels = await async_labels_collection.find({"user_id": user_id}).to_list(length=None)
     return [{**label, "_id": str(label["_id"])} for label in labels]
 
-def assign_labels_to_task(task_id: str, labels: list):
-    _initialize_database()
-    # Handle both MongoDB ObjectId and mock string IDs
-    if task_id.startswith("mock_id_"):
-        tasks_collection.update_one({"_id": task_id}, {"$set": {"labels": labels}})
-    else:
-        try:
-            tasks_collection.update_one({"_id": ObjectId(task_id)}, {"$set": {"labels": labels}})
-        except:
-            tasks_collection.update_one({"_id": task_id}, {"$set": {"labels": labels}})
+async def get_labels_json_async(user_id: str) -> bytes:
+    """get_labels_async() as a JSON body, served from the per-user list cache when current"""
+    body = list_cache.get(user_id, "labels")
+    if body is None:
+        await _initialize_async_database()
+        version = current_version(user_id, "labels")
+        body = dumps(await async_labels_collection.find({"user_id": user_id}).to_list(length=None))
+        list_cache.put(user_id, "labels", "", version, body)
+    return body
+
+async def assign_labels_to_task_async(task_id: str, labels: list, user_id: str):
+    await _initialize_async_database()
+    await async_tasks_collection.update_one({**build_id_query(task_id), "user_id": user_id},
+                                            {"$set": {"labels": labels, "updated_at": datetime.utcnow()}})
+    bump_version(user_id, "tasks")
     return True
 
+def _label_updates(query: dict, add: list, remove: list) -> list:
+    """(count name, query, update) for a batch label change.
+
+    MongoDB rejects $addToSet and $pull on the same path in one update, so a
+    mixed change is two update_many calls. Each query is narrowed to tasks
+    the update actually changes, so updated_at only moves on those.
+    """
+    updates = []
+    now = datetime.utcnow()
+    if remove:
+        narrowed = {**query, "$and": [*query.get("$and", []), {"labels": {"$in": remove}}]}
+        updates.append(("removed", narrowed, {"$pull": {"labels": {"$in": remove}}, "$set": {"updated_at": now}}))
+    if add:
+        missing_any = {"$or": [{"labels": {"$ne": label}} for label in add]}
+        narrowed = {**query, "$and": [*query.get("$and", []), missing_any]}
+        updates.append(("added", narrowed, {"$addToSet": {"labels": {"$each": add}}, "$set": {"updated_at": now}}))
+    return updates
+
+async def update_task_labels_async(query: dict, add: list = (), remove: list = ()):
+    """Add/remove labels on every task matching the query (which must name a
+    user_id); returns how many tasks gained and lost labels"""
+    await _initialize_async_database()
+    counts = {"added": 0, "removed": 0}
+    for name, narrowed, update in _label_updates(query, list(add), list(remove)):
+        counts[name] = (await async_tasks_collection.update_many(narrowed, update)).modified_count
+    bump_version(query["user_id"], "tasks")
+    return counts
+
 # Collection accessors
 def get_task_collection():
     _initialize_database()
@@ -150,3 +474,31 @@ def get_user_collection():
     _initialize_database()
     return users_collection
 
+def get_tombstone_collection():
+    _initialize_database()
+    return tombstones_collection
+
+def get_revocation_collection():
+    _initialize_database()
+    return revocations_collection
+
+# Async collection accessors
+async def get_async_task_collection():
+    await _initialize_async_database()
+    return async_tasks_collection
+
+async def get_async_label_collection():
+    await _initialize_async_database()
+    return async_labels_collection
+
+async def get_async_user_collection():
+    await _initialize_async_database()
+    return async_users_collection
+
+async def get_async_tombstone_collection():
+    await _initialize_async_database()
+    return async_tombstones_collection
+
+async def get_async_revocation_collection():
+    await _initialize_async_database()
+    return async_revocations_collection
@@ -0,0 +1,236 @@
+"""
+Per-user task and label events for GET /api/events (Server-Sent Events).
+
+EventHub fans events out to the open streams of the user they belong to.
+Events come from one of two sources, whichever store is serving:
+
+- MongoDB change streams on tasks, labels and task_tombstones (a tombstone
+  insert is how a task delete is reported, since delete events don't carry
+  user_id). Change streams need a replica set; on a standalone server the
+  watcher logs once and streams only carry keep-alives.
+- The MockCollection listener hook while the in-memory fallback is active.
+
+Each event is encoded into its SSE frame once and the same bytes are queued
+for every subscriber. A subscriber's queue is bounded; when a slow client
+falls EVENT_QUEUE_SIZE frames behind, its backlog is dropped and replaced
+by a single "resync" event, telling it to refetch (or call
+/api/tasks/changes), so one stalled connection never holds more than that.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+import app.database as database
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+EVENT_SOURCE_RETRY_SECONDS = float(os.getenv("EVENT_SOURCE_RETRY_SECONDS", "5"))
+
+# MongoDB error code for "The $changeStream stage is only supported on replica sets"
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+
+_EVENT_TYPES = {
+    ("tasks", "insert"): "task.created",
+    ("tasks", "update"): "task.updated",
+    ("tasks", "replace"): "task.updated",
+    ("tasks", "delete"): "task.deleted",
+    ("labels", "insert"): "label.created",
+    ("labels", "update"): "label.updated",
+    ("labels", "replace"): "label.updated",
+    ("labels", "delete"): "label.deleted",
+}
+
+KEEPALIVE_FRAME = b": keep-alive\n\n"
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, bytes)):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_event(event_type: str, doc: Dict[str, Any]) -> bytes:
+    """SSE frame for one event; deletes carry only the id"""
+    if event_type.endswith(".deleted"):
+        data = {"_id": str(doc["_id"])}
+    else:
+        data = {**doc, "_id": str(doc["_id"])}
+    payload = json.dumps(data, default=_json_default, separators=(",", ":"))
+    return f"event: {event_type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """One open stream: a bounded frame queue drained by the response"""
+
+    __slots__ = ("user_id", "_frames", "_ready", "_overflowed")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._frames: Deque[bytes] = deque()
+        self._ready = asyncio.Event()
+        self._overflowed = False
+
+    def offer(self, frame: bytes):
+        """Queue a frame without ever blocking the publisher (event loop thread only)"""
+        if self._overflowed:
+            return  # a resync is already pending; the client will refetch anyway
+        if len(self._frames) >= EVENT_QUEUE_SIZE:
+            self._frames.clear()
+            self._frames.append(RESYNC_FRAME)
+            self._overflowed = True
+        else:
+            self._frames.append(frame)
+        self._ready.set()
+
+    async def next_frame(self, timeout: float) -> bytes:
+        """The next frame, or a keep-alive comment if nothing arrives in time"""
+        if not self._frames:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return KEEPALIVE_FRAME
+        frame = self._frames.popleft()
+        if frame is RESYNC_FRAME:
+            self._overflowed = False
+        return frame
+
+
+class EventHub:
+    """Routes events to the subscriptions of the user they belong to"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the event loop the streams run on (call from that loop)"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def connection_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id: Any, event_type: str, doc: Dict[str, Any]):
+        """Deliver an event to the user's streams; safe to call from any thread"""
+        user_id = str(user_id)
+        if user_id not in self._subscribers or self._loop is None:
+            return
+        frame = encode_event(event_type, doc)
+        if threading.get_ident() == self._loop_thread:
+            self._deliver(user_id, frame)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, user_id, frame)
+
+    def _deliver(self, user_id: str, frame: bytes):
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.offer(frame)
+
+
+hub = EventHub()
+_source_task: Optional[asyncio.Task] = None
+# Where a restarted change stream picks up, so a dropped connection loses nothing
+_resume_token: Optional[dict] = None
+
+
+def _on_memory_store_change(collection_name: str, op: str, doc: Dict[str, Any]):
+    # Writes that land in the fallback after failback has switched to
+    # MongoDB (including the final clear) reach clients via the change stream
+    if database.USE_MONGODB is not False:
+        return
+    event_type = _EVENT_TYPES.get((collection_name, op))
+    if event_type is not None and doc.get("user_id") is not None:
+        hub.publish(doc["user_id"], event_type, doc)
+
+
+async def _watch_mongodb():
+    """Relay change stream events until the stream fails"""
+    global _resume_token
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": ["tasks", "labels", "task_tombstones"]},
+        "operationType": {"$in": ["insert", "update", "replace"]},
+    }}]
+    watched_db = database.async_client["todo_app"]
+    async with watched_db.watch(pipeline, full_document="updateLookup", resume_after=_resume_token) as stream:
+        logger.info("Streaming task and label events from MongoDB change streams")
+        async for change in stream:
+            _resume_token = stream.resume_token
+            doc = change.get("fullDocument")
+            if doc is None or doc.get("user_id") is None:
+                continue  # updated and then deleted before the lookup
+            collection_name = change["ns"]["coll"]
+            if collection_name == "task_tombstones":
+                hub.publish(doc["user_id"], "task.deleted", {"_id": doc["task_id"]})
+            else:
+                hub.publish(doc["user_id"], _EVENT_TYPES[(collection_name, change["operationType"])], doc)
+
+
+async def _run_sources():
+    global _resume_token
+    unsupported_reported = False
+    while True:
+        if database.USE_MONGODB and database.async_client is not None:
+            try:
+                await _watch_mongodb()
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                    if not unsupported_reported:
+                        logger.warning("MongoDB change streams need a replica set; /api/events will only send keep-alives")
+                        unsupported_reported = True
+                else:
+                    # e.g. the resume token fell off the oplog; start fresh
+                    logger.warning("Change stream failed", extra={"error": str(e)})
+                    _resume_token = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change stream interrupted", extra={"error": str(e)})
+        await asyncio.sleep(EVENT_SOURCE_RETRY_SECONDS)
+
+
+async def start_events():
+    """Bind the hub to the running loop and start feeding it (called from the app lifespan)"""
+    global _source_task
+    hub.bind(asyncio.get_running_loop())
+    if _on_memory_store_change not in database.memory_store_listeners:
+        database.add_memory_store_listener(_on_memory_store_change)
+    if _source_task is None:
+        _source_task = asyncio.create_task(_run_sources())
+
+
+async def stop_events():
+    global _source_task
+    if _source_task is not None:
+        _source_task.cancel()
+        try:
+            await _source_task
+        except asyncio.CancelledError:
+            pass
+        _source_task = None
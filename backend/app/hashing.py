@@ -0,0 +1,234 @@
+"""
+Password hashing off the API's own workers.
+
+bcrypt is deliberately slow (~250 ms a hash at the default cost). Done
+inline, or on the shared thread pool, a burst of signups and logins ties
+up the workers every other request needs. hash_password() and
+check_password() run it in a dedicated process pool instead, so it can't
+hold the GIL or the event loop either.
+
+The pool is bounded: at most PASSWORD_HASH_WORKERS hashes run at once and
+PASSWORD_HASH_QUEUE_SIZE more may wait. Anything beyond that raises
+HashingBusy straight away, which the auth routes turn into a 503 with
+Retry-After, instead of queueing work the client will have given up on.
+PASSWORD_HASH_WORKERS=0 runs hashes on threads (same bounds), for
+environments where worker processes are not wanted.
+
+The bcrypt cost is calibrated when the pool starts: one hash is timed at a
+low cost in a worker and the cost is scaled (each step doubles the time)
+to land nearest PASSWORD_HASH_TARGET_MS, within [PASSWORD_HASH_MIN_COST,
+PASSWORD_HASH_MAX_COST]. PASSWORD_HASH_COST pins it instead. Every bcrypt
+hash records the cost it was made with ($2b$<cost>$...), so needs_rehash()
+can tell a stored hash from an older setting; login rehashes those made at
+a lower cost. Higher ones are kept: calibration is timed per process, so
+workers and restarts can settle on neighbouring costs, and rehashing down
+as well as up would move users back and forth between them.
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+# Retry-After sent with the 503 when the queue is full
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+PASSWORD_HASH_MIN_COST = int(os.getenv("PASSWORD_HASH_MIN_COST", "10"))
+PASSWORD_HASH_MAX_COST = int(os.getenv("PASSWORD_HASH_MAX_COST", "16"))
+# Fixed cost; skips calibration when set
+PASSWORD_HASH_COST = os.getenv("PASSWORD_HASH_COST")
+
+# bcrypt.gensalt()'s default, used until calibration has run
+DEFAULT_COST = 12
+# Cost the calibration hash is timed at: fast, but long enough to measure
+_CALIBRATION_COST = 8
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+# Worker-side functions; module level so they pickle
+def _hash(password: bytes, cost: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(cost))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def _noop() -> None:
+    return None
+
+
+def _time_hash(cost: int, repeat: int) -> float:
+    """Fastest of ``repeat`` hashes at ``cost``, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(cost))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def hash_cost(hashed) -> int:
+    """The cost a bcrypt hash was made with ($2b$12$... -> 12)"""
+    if isinstance(hashed, str):
+        hashed = hashed.encode("ascii")
+    return int(hashed.split(b"$")[2])
+
+
+def cost_for_target(seconds_at_calibration_cost: float, target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+    """The cost whose hash time is nearest target_ms, within the configured bounds"""
+    steps = math.log2(target_ms / 1000 / seconds_at_calibration_cost)
+    return max(PASSWORD_HASH_MIN_COST, min(PASSWORD_HASH_MAX_COST, _CALIBRATION_COST + round(steps)))
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._busy_seconds = 0.0
+        self.cost = int(PASSWORD_HASH_COST) if PASSWORD_HASH_COST else DEFAULT_COST
+        self.calibrated_ms: Optional[float] = None
+        self.rehashed = 0
+
+    def start(self):
+        """Start the worker processes and calibrate the cost, before serving"""
+        if self.workers > 0:
+            executor = self._pool()
+            for future in [executor.submit(_noop) for _ in range(self.workers)]:
+                future.result()
+        if not PASSWORD_HASH_COST:
+            self.calibrate()
+
+    def calibrate(self, target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+        """Pick the cost for target_ms on this machine, timed where hashes run"""
+        if self.workers > 0:
+            seconds = self._pool().submit(_time_hash, _CALIBRATION_COST, 3).result()
+        else:
+            seconds = _time_hash(_CALIBRATION_COST, 3)
+        self.cost = cost_for_target(seconds, target_ms)
+        self.calibrated_ms = round(seconds * 2 ** (self.cost - _CALIBRATION_COST) * 1000, 1)
+        logger.info("bcrypt cost calibrated", extra={"cost": self.cost, "ms": self.calibrated_ms, "target_ms": target_ms})
+        return self.cost
+
+    def needs_rehash(self, hashed) -> bool:
+        """True if a stored hash was made with a lower cost than the current one"""
+        try:
+            return hash_cost(hashed) < self.cost
+        except (ValueError, IndexError):
+            return False
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads (the
+                # event loop's executors, the MongoDB monitor) is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset(self, broken: ProcessPoolExecutor):
+        # A worker died (OOM kill, segfault); the next call gets a fresh pool
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= max(self.workers, 1) + self.queue_size:
+                self.rejected += 1
+                raise HashingBusy()
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await asyncio.to_thread(fn, *args)
+            executor = self._pool()
+            try:
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+            except BrokenProcessPool:
+                self._reset(executor)
+                raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+                self._busy_seconds += time.perf_counter() - started
+
+    async def hash_password(self, password: bytes) -> bytes:
+        return await self._run(_hash, password, self.cost)
+
+    async def check_password(self, password: bytes, hashed: bytes) -> bool:
+        return await self._run(_check, password, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = min(self._in_flight, max(self.workers, 1))
+            return {
+                "workers": self.workers,
+                "cost": self.cost,
+                "calibrated_ms": self.calibrated_ms,
+                "queue_size": self.queue_size,
+                "running": running,
+                "queue_depth": self._in_flight - running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "avg_latency_ms": round(self._busy_seconds / self.completed * 1000, 1) if self.completed else None,
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+async def hash_password(password: bytes) -> bytes:
+    return await password_hasher.hash_password(password)
+
+
+async def check_password(password: bytes, hashed: bytes) -> bool:
+    return await password_hasher.check_password(password, hashed)
+
+
+async def rehash_password(users, user_id, password: bytes, old_hash: bytes) -> bool:
+    """
+    Re-hash a verified password at the current cost and store it, unless the
+    stored hash changed meanwhile. Returns True if the user was updated.
+    """
+    try:
+        new_hash = await password_hasher.hash_password(password)
+    except HashingBusy:
+        # Not worth a slot while logins are queueing; the next login retries
+        return False
+    result = await users.update_one({"_id": user_id, "password": old_hash}, {"$set": {"password": new_hash}})
+    if not result.modified_count:
+        return False
+    with password_hasher._lock:
+        password_hasher.rehashed += 1
+    return True
@@ -0,0 +1,120 @@
+"""
+MongoDB index definitions for the task, label and user query shapes.
+
+ensure_indexes() runs whenever the process connects to MongoDB (startup and
+failback). find_collscans() explains every query shape issued by
+database/task_db.py and the label/user helpers and reports the ones that
+would scan a whole collection; check_indexes.py wraps it for CI.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Tombstones of deleted tasks are kept this long for GET /api/tasks/changes;
+# MongoDB expires them with a TTL index, the in-memory store prunes on read
+TASK_TOMBSTONE_RETENTION_SECONDS = int(float(os.getenv("TASK_TOMBSTONE_RETENTION_DAYS", "30")) * 86400)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "tasks": [
+        # _id is the keyset pagination tie-breaker (see task_db.TASK_PAGE_SORT)
+        IndexModel([("user_id", ASCENDING), ("deadline", ASCENDING), ("_id", ASCENDING)], name="user_id_deadline_id"),
+        IndexModel([("user_id", ASCENDING), ("completed", ASCENDING)], name="user_id_completed"),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)], name="user_id_updated_at"),
+    ],
+    "task_tombstones": [
+        IndexModel([("user_id", ASCENDING), ("deleted_at", ASCENDING)], name="user_id_deleted_at"),
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=TASK_TOMBSTONE_RETENTION_SECONDS),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "revoked_tokens": [
+        IndexModel([("key", ASCENDING)], name="key"),
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        # expires_at is when the revoked token(s) would have expired anyway
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "labels": [
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING)], name="user_id_name"),
+    ],
+}
+
+# (collection, filter, sort) for every query the API sends to MongoDB
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    # database/task_db.py
+    ("tasks", {"user_id": "user"}, []),
+    ("tasks", {"user_id": "user"}, [("deadline", ASCENDING), ("_id", ASCENDING)]),
+    ("tasks", {
+        "user_id": "user",
+        "deadline": {"$gte": datetime(2025, 1, 1)},
+        "$or": [
+            {"deadline": {"$gt": datetime(2025, 1, 1)}},
+            {"deadline": datetime(2025, 1, 1), "_id": {"$gt": ObjectId()}},
+        ],
+    }, [("deadline", ASCENDING), ("_id", ASCENDING)]),
+    ("tasks", {
+        "user_id": "user",
+        "deadline": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 2, 1)},
+        "completed": False,
+        "priority": "High",
+        "labels": "work",
+    }, []),
+    ("tasks", {"user_id": "user", "completed": False}, []),
+    ("tasks", {"_id": ObjectId()}, []),
+    ("tasks", {"user_id": "user", "updated_at": {"$gt": datetime(2025, 1, 1)}}, []),
+    ("task_tombstones", {"user_id": "user", "deleted_at": {"$gt": datetime(2025, 1, 1)}}, []),
+    # bulk writes and batch label changes
+    ("tasks", {"user_id": "user", "_id": {"$in": [ObjectId(), ObjectId()]}}, []),
+    # app/database.py label helpers
+    ("labels", {"user_id": "user"}, []),
+    # app/auth.py and routes/auth_routes.py
+    ("users", {"email": "someone@example.com"}, []),
+    ("users", {"_id": ObjectId()}, []),
+    # app/revocation.py
+    ("revoked_tokens", {"key": "jti:abc"}, []),
+    ("revoked_tokens", {"key": "user:abc", "revoked_before": {"$gt": 0.0}}, []),
+    ("revoked_tokens", {"revoked_at": {"$gt": datetime(2025, 1, 1)}}, []),
+]
+
+
+def ensure_indexes(database) -> None:
+    """Create the indexes above; an index that fails is logged, not fatal"""
+    for collection_name, models in INDEXES.items():
+        collection = database[collection_name]
+        for model in models:
+            try:
+                collection.create_indexes([model])
+            except Exception as e:
+                # e.g. duplicate emails left over from before the unique index
+                logger.warning("Could not create index", extra={
+                    "index": model.document["name"], "collection": collection_name, "error": str(e),
+                })
+
+
+def _stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def find_collscans(database) -> List[str]:
+    """Explain every query shape; return descriptions of those using COLLSCAN"""
+    offenders = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in set(_stages(winning_plan)):
+            offenders.append(f"{collection_name}.find({sorted(query)}) sort={sort}")
+    return offenders
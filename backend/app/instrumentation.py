@@ -0,0 +1,386 @@
+"""
+Timing and profiling of every database operation.
+
+app/database.py wraps each collection it hands out (sync and async, MongoDB
+and the in-memory store) in instrument(). The wrapper times the operations
+listed in OPERATIONS and adds them to:
+
+- process-wide totals per (collection, operation), exported on /metrics;
+- the current request's call count and time, if a request is being
+  measured (see track_request(); the /metrics middleware does this);
+- per query shape statistics (GET /db/stats): the shape is the filter
+  with every value dropped, e.g. {deadline:{$gte,$lt},user_id}, so calls
+  that differ only in values aggregate together. Each shape keeps a count,
+  total and max, and the last DB_QUERY_SAMPLES durations for p50/p95/p99.
+
+An operation slower than DB_SLOW_QUERY_MS is logged to the
+"app.slow_queries" logger (shape and duration, never values) and kept in a
+short in-memory list. With DB_SLOW_QUERY_EXPLAIN on and MongoDB serving,
+the slow filter is also explain()ed on a background thread, at most once
+per shape every DB_SLOW_QUERY_EXPLAIN_INTERVAL seconds, and the winning
+plan is attached to the record.
+
+Everything else (watch, create_indexes, the mock store's internals) is
+passed through untouched. A find() that returns a cursor is counted when
+it is created; the time spent reading it (to_list, for loops) is added to
+the operation, and the shape sample is taken once it has been read. The
+wrapper reports the wrapped object's class, so isinstance() checks against
+MockCollection still hold.
+"""
+
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+OPERATIONS = frozenset({
+    "find", "find_one", "find_ordered", "count_documents", "aggregate",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write",
+})
+# Operations whose first argument is a filter explain() can run
+_EXPLAINABLE = frozenset({
+    "find", "find_one", "count_documents", "update_one", "update_many",
+    "replace_one", "delete_one", "delete_many",
+})
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes")
+DB_SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+DB_QUERY_SAMPLES = int(os.getenv("DB_QUERY_SAMPLES", "512"))
+# Shapes tracked before new ones are folded into "(other)"
+DB_QUERY_MAX_SHAPES = int(os.getenv("DB_QUERY_MAX_SHAPES", "1000"))
+SLOW_QUERY_LOG_SIZE = 100
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+# [calls, seconds] of the request being handled, shared with the threads
+# it hands work to (asyncio.to_thread and the sync-route threadpool copy
+# the context, and with it this list)
+_request_usage: ContextVar[Optional[List[float]]] = ContextVar("db_request_usage", default=None)
+
+_lock = threading.Lock()
+# (collection, operation) -> [calls, seconds]
+_totals: Dict[Tuple[str, str], List[float]] = {}
+
+
+def track_request() -> Tuple[List[float], Any]:
+    """Start counting DB calls for the current request; returns (usage, reset token)"""
+    usage = [0, 0.0]
+    return usage, _request_usage.set(usage)
+
+
+def stop_tracking(token: Any):
+    _request_usage.reset(token)
+
+
+def _record(collection: str, operation: str, seconds: float, call: bool = True):
+    usage = _request_usage.get()
+    if usage is not None:
+        if call:
+            usage[0] += 1
+        usage[1] += seconds
+    key = (collection, operation)
+    with _lock:
+        totals = _totals.get(key)
+        if totals is None:
+            totals = _totals[key] = [0, 0.0]
+        if call:
+            totals[0] += 1
+        totals[1] += seconds
+
+
+def operation_totals() -> Dict[Tuple[str, str], Tuple[int, float]]:
+    with _lock:
+        return {key: (int(calls), seconds) for key, (calls, seconds) in _totals.items()}
+
+
+# Query shapes
+def _shape(value: Any) -> str:
+    if isinstance(value, dict):
+        parts = []
+        for key in sorted(value, key=str):
+            inner = _shape(value[key])
+            parts.append(f"{key}:{inner}" if inner else str(key))
+        return "{" + ",".join(parts) + "}"
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        # $or / $and branches; identical branches collapse
+        return "[" + ",".join(sorted({_shape(item) for item in value})) + "]"
+    return ""
+
+
+def query_shape(operation: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """The filter of an operation with every value removed"""
+    if operation == "bulk_write":
+        requests = args[0] if args else kwargs.get("requests", ())
+        return "[" + ",".join(sorted({type(request).__name__ for request in requests})) + "]"
+    if operation in ("insert_one", "insert_many"):
+        return ""
+    query = args[0] if args else kwargs.get("filter", kwargs.get("query"))
+    if operation == "aggregate":
+        return "[" + ",".join(next(iter(stage), "") for stage in query or ()) + "]"
+    return _shape(query or {})
+
+
+class _ShapeStats:
+    __slots__ = ("count", "total", "max", "samples", "position", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Ring of the latest DB_QUERY_SAMPLES durations
+        self.samples: List[float] = []
+        self.position = 0
+        self.slow = 0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if len(self.samples) < DB_QUERY_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.position] = seconds
+            self.position = (self.position + 1) % DB_QUERY_SAMPLES
+
+
+# (collection, operation, shape) -> stats
+_shapes: Dict[Tuple[str, str, str], _ShapeStats] = {}
+_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+# Returns the sync MongoDB collection to explain() on, or None when the
+# in-memory store is serving; set by app/database.py
+_explain_source: Optional[Callable[[str], Any]] = None
+_explained_at: Dict[Tuple[str, str, str], float] = {}
+_explain_executor: Optional[ThreadPoolExecutor] = None
+
+
+def set_explain_source(source: Optional[Callable[[str], Any]]):
+    global _explain_source
+    _explain_source = source
+
+
+def _observe(collection: str, operation: str, seconds: float, args: tuple, kwargs: Dict[str, Any]):
+    shape = query_shape(operation, args, kwargs)
+    key = (collection, operation, shape)
+    slow = seconds * 1000 >= DB_SLOW_QUERY_MS
+    with _lock:
+        stats = _shapes.get(key)
+        if stats is None:
+            if len(_shapes) >= DB_QUERY_MAX_SHAPES:
+                key = (collection, operation, "(other)")
+                stats = _shapes.get(key)
+            if stats is None:
+                stats = _shapes[key] = _ShapeStats()
+        stats.add(seconds)
+        if slow:
+            stats.slow += 1
+    if slow:
+        _log_slow_query(key, seconds, args, kwargs)
+
+
+def _log_slow_query(key: Tuple[str, str, str], seconds: float, args: tuple, kwargs: Dict[str, Any]):
+    collection, operation, shape = key
+    record = {
+        "at": datetime.utcnow().isoformat(),
+        "collection": collection,
+        "operation": operation,
+        "shape": shape,
+        "ms": round(seconds * 1000, 1),
+    }
+    _slow_queries.append(record)
+    slow_query_logger.warning("Slow query", extra={field: record[field] for field in ("collection", "operation", "shape", "ms")})
+    source = _explain_source
+    if not DB_SLOW_QUERY_EXPLAIN or source is None or operation not in _EXPLAINABLE:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _explained_at.get(key, float("-inf")) < DB_SLOW_QUERY_EXPLAIN_INTERVAL:
+            return
+        _explained_at[key] = now
+    query = args[0] if args else kwargs.get("filter", {})
+    _explainer().submit(_explain, source, record, query)
+
+
+def _explainer() -> ThreadPoolExecutor:
+    global _explain_executor
+    if _explain_executor is None:
+        _explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+    return _explain_executor
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages += _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def _explain(source: Callable[[str], Any], record: Dict[str, Any], query: Dict[str, Any]):
+    try:
+        explained = source(record["collection"]).find(query).explain()
+        winning = explained["queryPlanner"]["winningPlan"]
+        summary = {"stages": _plan_stages(winning.get("queryPlan", winning))}
+        execution = explained.get("executionStats")
+        if execution:
+            for field in ("nReturned", "totalKeysExamined", "totalDocsExamined", "executionTimeMillis"):
+                summary[field] = execution.get(field)
+        record["explain"] = summary
+        slow_query_logger.warning("Slow query plan", extra={
+            **{field: record[field] for field in ("collection", "operation", "shape")}, "plan": summary,
+        })
+    except Exception as e:
+        record["explain"] = {"error": str(e)}
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def query_stats() -> Dict[str, Any]:
+    """Per-shape counts and latency percentiles (slowest total first), and recent slow queries"""
+    with _lock:
+        snapshot = [(key, stats.count, stats.total, stats.max, stats.slow, list(stats.samples))
+                    for key, stats in _shapes.items()]
+        slow = list(_slow_queries)
+    shapes = []
+    for (collection, operation, shape), count, total, longest, slow_count, samples in snapshot:
+        samples.sort()
+        shapes.append({
+            "collection": collection,
+            "operation": operation,
+            "shape": shape,
+            "count": count,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total / count * 1000, 3),
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(longest * 1000, 3),
+            "slow": slow_count,
+        })
+    shapes.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return {"slow_query_ms": DB_SLOW_QUERY_MS, "shapes": shapes, "slow_queries": slow[::-1]}
+
+
+def slow_query_count() -> int:
+    with _lock:
+        return sum(stats.slow for stats in _shapes.values())
+
+
+def reset_query_stats():
+    with _lock:
+        _shapes.clear()
+        _slow_queries.clear()
+        _explained_at.clear()
+
+
+class InstrumentedCursor:
+    """Adds the time spent reading a cursor to the find() that opened it"""
+
+    def __init__(self, cursor: Any, collection: str, operation: str, opened: float, args: tuple, kwargs: Dict[str, Any]):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+        self._opened = opened
+        self._args = args
+        self._kwargs = kwargs
+
+    @property
+    def __class__(self):
+        return self._cursor.__class__
+
+    def _read(self, seconds: float):
+        _record(self._collection, self._operation, seconds, call=False)
+        _observe(self._collection, self._operation, self._opened + seconds, self._args, self._kwargs)
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._cursor, name)
+        if name == "to_list":
+            async def to_list(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                finally:
+                    self._read(time.perf_counter() - started)
+            return to_list
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            # sort(), limit() and friends return the cursor itself
+            result = attribute(*args, **kwargs)
+            return self if result is self._cursor else result
+        return chained
+
+    def __iter__(self):
+        started = time.perf_counter()
+        try:
+            yield from self._cursor
+        finally:
+            self._read(time.perf_counter() - started)
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        try:
+            async for doc in self._cursor:
+                yield doc
+        finally:
+            self._read(time.perf_counter() - started)
+
+
+class InstrumentedCollection:
+    """Times the OPERATIONS of a sync or async collection"""
+
+    def __init__(self, collection: Any, name: str):
+        self._collection = collection
+        self._name = name
+
+    @property
+    def __class__(self):
+        return self._collection.__class__
+
+    @property
+    def wrapped(self) -> Any:
+        return self._collection
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._collection, name)
+        if name not in OPERATIONS:
+            return attribute
+        collection_name = self._name
+
+        def operation(*args, **kwargs):
+            started = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return _timed(result, collection_name, name, started, args, kwargs)
+            elapsed = time.perf_counter() - started
+            _record(collection_name, name, elapsed)
+            if hasattr(result, "to_list") or hasattr(result, "next"):
+                return InstrumentedCursor(result, collection_name, name, elapsed, args, kwargs)
+            _observe(collection_name, name, elapsed, args, kwargs)
+            return result
+        return operation
+
+
+async def _timed(awaitable, collection: str, operation: str, started: float, args: tuple, kwargs: Dict[str, Any]):
+    try:
+        return await awaitable
+    finally:
+        elapsed = time.perf_counter() - started
+        _record(collection, operation, elapsed)
+        _observe(collection, operation, elapsed, args, kwargs)
+
+
+def instrument(collection: Any, name: str) -> InstrumentedCollection:
+    return InstrumentedCollection(collection, name)
@@ -0,0 +1,236 @@
+"""
+Structured logging that stays off the request path.
+
+configure_logging() (called once from app/main.py) sends every logger,
+uvicorn's included, through a single QueueHandler. Logging from a request
+then costs a level check, the sampler and a put on a bounded queue; a
+QueueListener thread turns records into one JSON object per line on
+stdout. When the queue is full the record is dropped and counted instead
+of making the request wait for the terminal.
+
+- Levels per category (logger name): LOG_LEVEL is the default and
+  LOG_LEVELS overrides it per category, e.g.
+  "app.auth=DEBUG,uvicorn.access=WARNING". A disabled level costs one
+  cached comparison.
+- Sampling: each (logger, message template) may emit
+  LOG_SAMPLE_PER_SECOND records a second, in bursts of LOG_SAMPLE_BURST;
+  the rest are dropped, and the next record of that template to get
+  through carries "suppressed": n. Pass values as extra fields (or %
+  arguments), not in f-strings, so a template keeps one bucket.
+- Access log lines (uvicorn.access) leave out the query string, which
+  can carry credentials (GET /api/events?token=...).
+- Correlation: RequestIdMiddleware takes the request's X-Request-ID (or
+  makes one), echoes it on the response, and every record logged while
+  serving the request carries it as "request_id".
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.ratelimit import TokenBucketLimiter
+from app.serialization import dumps
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_PER_SECOND = float(os.getenv("LOG_SAMPLE_PER_SECOND", "20"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "50"))
+# Templates tracked by the sampler; the longest idle is forgotten first
+LOG_SAMPLE_MAX_KEYS = 1000
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Client-supplied ids are used only if they look like one
+_VALID_REQUEST_ID = re.compile(rb"[A-Za-z0-9._:-]{1,128}")
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed as an extra field
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class SamplingFilter(logging.Filter):
+    """Rate-limits each (logger, message template), counting what it drops"""
+
+    def __init__(self, per_second: float = LOG_SAMPLE_PER_SECOND, burst: int = LOG_SAMPLE_BURST):
+        super().__init__()
+        self._limiter = TokenBucketLimiter(per_second * 60, burst, max_keys=LOG_SAMPLE_MAX_KEYS)
+        self._suppressed: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.msg)
+        if self._limiter.acquire(key):
+            with self._lock:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                if len(self._suppressed) > LOG_SAMPLE_MAX_KEYS:
+                    del self._suppressed[next(iter(self._suppressed))]
+            return False
+        if self._suppressed:
+            with self._lock:
+                suppressed = self._suppressed.pop(key, 0)
+            if suppressed:
+                record.suppressed = suppressed
+        return True
+
+    @property
+    def suppressed(self) -> int:
+        return self._limiter.rejected
+
+
+class AccessLogFilter(logging.Filter):
+    """Strips the query string from the path in uvicorn's access records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # uvicorn logs (client, method, path with query, http version, status)
+        if record.name == "uvicorn.access" and isinstance(record.args, tuple) and len(record.args) == 5:
+            path = record.args[2]
+            if isinstance(path, str) and "?" in path:
+                record.args = (*record.args[:2], path.partition("?")[0], *record.args[3:])
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records with their request id; drops them when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Runs on the caller's thread: resolve everything that depends on it
+        # (the arguments, the exception, the request) and leave formatting
+        # to the listener
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, request_id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES and value is not None:
+                entry[name] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        try:
+            return dumps(entry).decode("utf-8")
+        except TypeError:
+            return dumps({name: value if isinstance(value, (str, int, float, bool)) else str(value)
+                          for name, value in entry.items()}).decode("utf-8")
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_sampler: Optional[SamplingFilter] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _category_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through the queue (idempotent)"""
+    global _handler, _sampler, _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _sampler = SamplingFilter()
+    _handler.addFilter(AccessLogFilter())
+    _handler.addFilter(_sampler)
+    _listener = logging.handlers.QueueListener(log_queue, stream)
+
+    # Not part of the output; don't collect them for every record
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    # uvicorn installs its own (blocking) handlers; send its records here too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers.clear()
+        logger.propagate = True
+        logger.setLevel(logging.NOTSET)
+    for name, level in _category_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def logging_stats() -> Dict[str, int]:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "suppressed": _sampler.suppressed if _sampler else 0,
+    }
+
+
+class RequestIdMiddleware:
+    """Gives each HTTP request an id for its log records and the X-Request-ID header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                if _VALID_REQUEST_ID.fullmatch(value):
+                    current = value.decode("ascii")
+                break
+        if current is None:
+            current = uuid.uuid4().hex
+        # Not reset afterwards: the 500 handler runs outside this middleware
+        # and logs with it, and each request gets its own task (and context)
+        request_id.set(current)
+        header = (REQUEST_ID_HEADER, current.encode("ascii"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [header]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
@@ -1,16 +1,51 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import logging
 import sys
 import os
+from contextlib import asynccontextmanager
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Setup path for route imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configure logging: JSON lines, written by a background thread (app/logs.py)
+from app.logs import configure_logging, logging_stats, RequestIdMiddleware
+configure_logging()
 logger = logging.getLogger(__name__)
+health_logger = logging.getLogger("app.health")
+
+from app.database import startup_database, shutdown_database
+from app.events import start_events, stop_events
+from app.cache import list_cache
+from app.auth import auth_cache_stats
+from app.hashing import password_hasher
+from app.ratelimit import rate_limit_stats
+from app.revocation import start_revocations, stop_revocations, revocations
+from app.instrumentation import query_stats, slow_query_count
+from app.metrics import MetricsMiddleware, render_metrics, register_collector, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.events import hub
+from app.auth import user_cache, token_cache
+from app.ratelimit import ip_limiter, email_limiter
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect (or fall back to in-memory storage) before serving traffic, so
+    # the first request doesn't pay for it, and keep monitoring MongoDB
+    await startup_database()
+    await asyncio.to_thread(password_hasher.start)
+    await start_revocations()
+    await start_events()
+    yield
+    await stop_events()
+    await stop_revocations()
+    await asyncio.to_thread(password_hasher.shutdown)
+    await shutdown_database()
 
 # Create FastAPI app with explicit docs configuration
 app = FastAPI(
+    lifespan=lifespan,
     title="Todo App API",
     description="A simple todo application API",
     version="1.0.0",
@@ -40,21 +75,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
+# Outermost, so it times everything the app does for a request
+app.add_middleware(MetricsMiddleware)
 
 # Health check route
 @app.get("/", tags=["health"])
 def read_root():
-    logger.info("Health check endpoint accessed")
+    health_logger.debug("Health check")
     return {"message": "Hello, FastAPI!", "status": "healthy"}
 
-# Setup path for route imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+@app.get("/cache/stats", tags=["health"])
+def cache_stats():
+    """Counters of the task/label list cache and the user/token caches"""
+    return {"lists": list_cache.stats(), **auth_cache_stats()}
+
+@app.get("/logs/stats", tags=["health"])
+def log_stats():
+    """Log records waiting to be written, dropped (queue full) and sampled away"""
+    return logging_stats()
+
+@app.get("/auth/stats", tags=["health"])
+def auth_stats():
+    """Password hashing pool and the /login, /signup rate limiters"""
+    return {"hashing": password_hasher.stats(), "rate_limits": rate_limit_stats()}
+
+@app.get("/db/stats", tags=["health"])
+def db_stats():
+    """Latency percentiles per query shape, and the latest slow queries"""
+    return query_stats()
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def metrics():
+    """Prometheus text format (see app/metrics.py)"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+# Counters kept by other modules, exported on /metrics
+_caches = {"lists": list_cache, "users": user_cache, "tokens": token_cache}
+_limiters = {"ip": ip_limiter, "email": email_limiter}
+for _stat in ("hits", "misses", "evictions"):
+    register_collector(
+        f"cache_{_stat}_total", "counter", f"Cache {_stat} by cache",
+        lambda stat=_stat: [({"cache": name}, cache.stats()[stat]) for name, cache in _caches.items()],
+    )
+register_collector("cache_entries", "gauge", "Entries held by each cache",
+                   lambda: [({"cache": name}, cache.stats()["entries"]) for name, cache in _caches.items()])
+register_collector("list_cache_bytes", "gauge", "Bytes of serialized lists in the list cache",
+                   lambda: list_cache.stats()["bytes"])
+register_collector("password_hash_running", "gauge", "Password hashes being computed",
+                   lambda: password_hasher.stats()["running"])
+register_collector("password_hash_queue_depth", "gauge", "Password hashes waiting for a worker",
+                   lambda: password_hasher.stats()["queue_depth"])
+register_collector("password_hash_rejected_total", "counter", "Password hashes refused because the queue was full",
+                   lambda: password_hasher.rejected)
+register_collector("auth_rate_limited_total", "counter", "Auth attempts refused by each rate limiter",
+                   lambda: [({"limiter": name}, limiter.rejected) for name, limiter in _limiters.items()])
+register_collector("token_revocation_checks_total", "counter", "Tokens checked against the revocation filter",
+                   lambda: revocations.checks)
+register_collector("token_revocation_store_lookups_total", "counter", "Revocation filter hits confirmed in the store",
+                   lambda: revocations.store_lookups)
+register_collector("db_slow_queries_total", "counter", "Database operations slower than DB_SLOW_QUERY_MS",
+                   slow_query_count)
+register_collector("log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+                   lambda: logging_stats()["dropped"])
+register_collector("log_records_suppressed_total", "counter", "Log records dropped by rate-limited sampling",
+                   lambda: logging_stats()["suppressed"])
+register_collector("event_stream_connections", "gauge", "Open /api/events streams",
+                   hub.connection_count)
 
 # Add exception handler for better error reporting
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error("Unhandled exception", extra={"error": str(exc)})
     return JSONResponse(
         status_code=500,
         content={"error": "Internal server error", "detail": str(exc)}
@@ -66,7 +160,10 @@ from fastapi.exceptions import RequestValidationError
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"Validation error: {exc.errors()}")
+    # Without the offending input, which can be a password
+    logger.error("Validation error", extra={"errors": [
+        {field: error.get(field) for field in ("type", "loc", "msg")} for error in exc.errors()
+    ]})
     return JSONResponse(
         status_code=400,
         content={
@@ -82,7 +179,7 @@ try:
     app.include_router(auth_routes.router, tags=["auth"])
     logger.info("Auth routes loaded successfully")
 except Exception as e:
-    logger.error(f"Failed to load auth routes: {e}")
+    logger.error("Failed to load routes", extra={"routes": "auth", "error": str(e)})
     import traceback
     traceback.print_exc()
 
@@ -92,7 +189,7 @@ try:
     app.include_router(task_routes.router, prefix="/api", tags=["tasks"])
     logger.info("Task routes loaded successfully")
 except Exception as e:
-    logger.error(f"Failed to load task routes: {e}")
+    logger.error("Failed to load routes", extra={"routes": "task", "error": str(e)})
     import traceback
     traceback.print_exc()
 
@@ -102,7 +199,17 @@ try:
     app.include_router(label_routes.router, prefix="/api", tags=["labels"])
     logger.info("Label routes loaded successfully")
 except Exception as e:
-    logger.error(f"Failed to load label routes: {e}")
+    logger.error("Failed to load routes", extra={"routes": "label", "error": str(e)})
+    import traceback
+    traceback.print_exc()
+
+try:
+    logger.info("Loading event routes...")
+    from routes import event_routes
+    app.include_router(event_routes.router, prefix="/api", tags=["events"])
+    logger.info("Event routes loaded successfully")
+except Exception as e:
+    logger.error("Failed to load routes", extra={"routes": "event", "error": str(e)})
     import traceback
     traceback.print_exc()
 
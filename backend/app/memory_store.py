@@ -0,0 +1,740 @@
+import asyncio
+import bisect
+import threading
+from datetime import datetime
+from bson import ObjectId
+from contextlib import nullcontext
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class _Result:
+    """Lightweight result object shaped like pymongo's *Result classes"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+_result = _Result
+
+
+def order_value(value: Any) -> tuple:
+    """Sort key that orders mixed types like MongoDB does (null < numbers < strings < dates)"""
+    if type(value) is datetime:  # deadlines, the usual order_by; checked first for bulk inserts
+        return (6, value)
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, bytes):
+        return (3, value)
+    if isinstance(value, datetime):
+        return (6, value)
+    return (9, str(value))
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    # Like MongoDB, a scalar condition also matches an array that contains it
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value: Any, bound: Any, op: str) -> bool:
+    # Range operators only compare values of the same type bracket
+    left, right = order_value(value), order_value(bound)
+    if left[0] != right[0]:
+        return False
+    if op == "$gt":
+        return left > right
+    if op == "$gte":
+        return left >= right
+    if op == "$lt":
+        return left < right
+    return left <= right
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if not (isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition)):
+        return _equals(value, condition)
+    for op, arg in condition.items():
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            values = value if isinstance(value, list) else [value]
+            ok = any(_compare(v, arg, op) for v in values)
+        elif op == "$eq":
+            ok = _equals(value, arg)
+        elif op == "$ne":
+            ok = not _equals(value, arg)
+        elif op == "$in":
+            ok = any(_equals(value, candidate) for candidate in arg)
+        elif op == "$nin":
+            ok = not any(_equals(value, candidate) for candidate in arg)
+        else:
+            raise ValueError(f"Unsupported query operator for in-memory storage: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate the subset of the MongoDB query language the API uses"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif not _match_condition(doc.get(key), condition):
+            return False
+    return True
+
+
+def update_changes(doc: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve $set/$addToSet/$pull against a document into the new field values.
+
+    Nothing is modified; the result is applied like a $set, which also keeps
+    journal records (and their replay) to plain field assignments.
+    """
+    changes: Dict[str, Any] = {}
+    for op, fields in update.items():
+        if op == "$set":
+            changes.update((k, v) for k, v in fields.items() if k != "_id")
+        elif op == "$addToSet":
+            for field, value in fields.items():
+                current = list(changes.get(field, doc.get(field)) or [])
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in items:
+                    if item not in current:
+                        current.append(item)
+                changes[field] = current
+        elif op == "$pull":
+            for field, condition in fields.items():
+                current = changes.get(field, doc.get(field)) or []
+                changes[field] = [item for item in current if not _match_condition(item, condition)]
+        else:
+            raise ValueError(f"Unsupported update operator for in-memory storage: {op}")
+    return changes
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Shard:
+    """One partition of a collection: its documents, indexes and lock"""
+
+    __slots__ = ("lock", "docs", "indexes", "order")
+
+    def __init__(self, index_fields: Iterable[str]):
+        self.lock = threading.RLock()
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Dict[Any, None]]] = {field: {} for field in index_fields}
+        # Sorted (order_value(doc[order_by]), _id) keys, when order_by is set
+        self.order: List[tuple] = []
+
+
+class MockCollection:
+    """In-memory stand-in for a MongoDB collection.
+
+    Documents are partitioned into shards by ``shard_key`` (``user_id`` for
+    tasks and labels), each with its own lock, so requests from different
+    users never contend. Inside a shard, documents live in a dict keyed by
+    ``_id`` and every field listed in ``indexes`` has a hash index
+    (value -> ordered set of ids), so equality lookups on those fields only
+    touch the matching documents. Collections without a shard key keep
+    everything in a single shard. With ``order_by`` set, each shard also
+    keeps its documents sorted by ``(order_by, _id)`` for find_ordered().
+    """
+
+    def __init__(self, collection_name: str, indexes: Iterable[str] = ("user_id", "email"),
+                 shard_key: Optional[str] = None, order_by: Optional[str] = None):
+        self.collection_name = collection_name
+        self.shard_key = shard_key
+        self.order_by = order_by
+        self._index_fields = tuple(field for field in indexes if field != shard_key)
+        self._shards: Dict[Any, _Shard] = {}
+        self._shards_lock = threading.Lock()
+        # _id -> shard key value, for routing lookups by _id. Single dict
+        # get/set/pop calls are atomic under the GIL, so no lock is needed.
+        self._locations: Dict[Any, Any] = {}
+        # Optional write-ahead journal (see app.persistence), set by attach()
+        self.journal = None
+        # Change listeners, called as listener(collection_name, op, doc) with
+        # op "insert"/"update"/"delete" (see add_listener)
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+
+    # Sharding
+    def _key_for(self, doc: Dict[str, Any]) -> Any:
+        if self.shard_key is None:
+            return None
+        value = doc.get(self.shard_key)
+        return value if _hashable(value) else None
+
+    def _shard(self, key: Any) -> _Shard:
+        shard = self._shards.get(key)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.get(key)
+                if shard is None:
+                    shard = self._shards[key] = _Shard(self._index_fields)
+        return shard
+
+    def _shards_for(self, query: Dict[str, Any]) -> List[_Shard]:
+        """Return the shards that can hold documents matching the query"""
+        if self.shard_key is not None and self.shard_key in query and _hashable(query[self.shard_key]):
+            shard = self._shards.get(query[self.shard_key])
+            return [shard] if shard is not None else []
+        if "_id" in query and _hashable(query["_id"]):
+            key = self._locations.get(query["_id"], _MISSING)
+            if key is _MISSING:
+                return []
+            shard = self._shards.get(key)
+            return [shard] if shard is not None else []
+        return list(self._shards.values())
+
+    @staticmethod
+    def _next_id() -> str:
+        # ObjectId-based so ids stay unique across restarts and never clash
+        # with documents already migrated to MongoDB
+        return f"mock_id_{ObjectId()}"
+
+    # Index maintenance (caller holds the shard lock)
+    def _order_key(self, doc: Dict[str, Any]) -> tuple:
+        return (order_value(doc.get(self.order_by)), doc["_id"])
+
+    def _index_add(self, shard: _Shard, doc: Dict[str, Any]):
+        doc_id = doc["_id"]
+        for field, index in shard.indexes.items():
+            value = doc.get(field)
+            if _hashable(value):
+                index.setdefault(value, {})[doc_id] = None
+        if self.order_by is not None:
+            bisect.insort(shard.order, self._order_key(doc))
+
+    def _index_remove(self, shard: _Shard, doc: Dict[str, Any]):
+        doc_id = doc["_id"]
+        for field, index in shard.indexes.items():
+            value = doc.get(field)
+            if not _hashable(value):
+                continue
+            bucket = index.get(value)
+            if bucket is not None:
+                bucket.pop(doc_id, None)
+                if not bucket:
+                    del index[value]
+        if self.order_by is not None:
+            key = self._order_key(doc)
+            position = bisect.bisect_left(shard.order, key)
+            if position < len(shard.order) and shard.order[position] == key:
+                del shard.order[position]
+
+    # Query planning (caller holds the shard lock)
+    @staticmethod
+    def _candidates(shard: _Shard, query: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        """Return the smallest set of documents in the shard that can satisfy the query"""
+        if "_id" in query and _hashable(query["_id"]):
+            doc = shard.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        id_condition = query.get("_id")
+        if isinstance(id_condition, dict) and list(id_condition) == ["$in"]:
+            docs = (shard.docs.get(doc_id) for doc_id in dict.fromkeys(filter(_hashable, id_condition["$in"])))
+            return [doc for doc in docs if doc is not None]
+
+        best: Optional[Dict[Any, None]] = None
+        for field, value in query.items():
+            index = shard.indexes.get(field)
+            if index is None or not _hashable(value):
+                continue
+            bucket = index.get(value, {})
+            if best is None or len(bucket) < len(best):
+                best = bucket
+                if not best:
+                    break
+        if best is None:
+            return list(shard.docs.values())
+        return [shard.docs[doc_id] for doc_id in best]
+
+    _matches = staticmethod(matches)
+
+    def _first_match(self, shard: _Shard, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        for doc in self._candidates(shard, query):
+            if self._matches(doc, query):
+                return doc
+        return None
+
+    # Storage primitives, shared by the public API and journal replay
+    def _place(self, doc: Dict[str, Any]):
+        """Store a document in the shard its shard key maps to"""
+        key = self._key_for(doc)
+        shard = self._shard(key)
+        with shard.lock:
+            shard.docs[doc["_id"]] = doc
+            self._index_add(shard, doc)
+            self._locations[doc["_id"]] = key
+
+    def _place_batch(self, shard: _Shard, key: Any, docs: List[Dict[str, Any]]):
+        """_place() for many new documents of one shard (caller holds its lock).
+
+        The ordered index is extended and re-sorted once instead of an
+        insort per document.
+        """
+        locations = self._locations
+        for doc in docs:
+            shard.docs[doc["_id"]] = doc
+            locations[doc["_id"]] = key
+        if shard.indexes:
+            for doc in docs:
+                for field, field_index in shard.indexes.items():
+                    value = doc.get(field)
+                    if _hashable(value):
+                        field_index.setdefault(value, {})[doc["_id"]] = None
+        if self.order_by is not None:
+            order_by = self.order_by
+            shard.order.extend((order_value(doc.get(order_by)), doc["_id"]) for doc in docs)
+            shard.order.sort()
+
+    def _load(self, docs: Iterable[Dict[str, Any]]):
+        """Bulk _apply_insert() for documents whose ids are not stored yet.
+
+        Used to load a snapshot into empty collections: no journaling, no
+        listeners, and every shard is indexed once.
+        """
+        by_shard: Dict[Any, List[Dict[str, Any]]] = {}
+        for doc in docs:
+            key = self._key_for(doc)
+            shard_docs = by_shard.get(key)
+            if shard_docs is None:
+                shard_docs = by_shard[key] = []
+            shard_docs.append(doc)
+        for key, shard_docs in by_shard.items():
+            shard = self._shard(key)
+            with shard.lock:
+                self._place_batch(shard, key, shard_docs)
+
+    def _apply_insert(self, doc: Dict[str, Any]):
+        previous = self._get(doc["_id"])
+        if previous is not None:
+            self._apply_delete(previous)
+        self._place(doc)
+
+    def _set_fields(self, shard: _Shard, doc: Dict[str, Any], changes: Dict[str, Any]) -> bool:
+        """Apply changes in place; returns True if the document left the shard.
+
+        The caller holds the shard lock and must _place() a moved document
+        after releasing it, so two shard locks are never held at once.
+        """
+        old_key = self._key_for(doc)
+        reindex = (self.shard_key in changes or self.order_by in changes
+                   or any(field in shard.indexes for field in changes))
+        if reindex:
+            self._index_remove(shard, doc)
+        doc.update(changes)
+        if self._key_for(doc) != old_key:
+            del shard.docs[doc["_id"]]
+            return True
+        if reindex:
+            self._index_add(shard, doc)
+        return False
+
+    def _apply_set(self, doc: Dict[str, Any], changes: Dict[str, Any]):
+        shard = self._shard(self._key_for(doc))
+        with shard.lock:
+            moved = self._set_fields(shard, doc, changes)
+        if moved:
+            self._place(doc)
+
+    def _apply_delete(self, doc: Dict[str, Any]):
+        shard = self._shard(self._key_for(doc))
+        with shard.lock:
+            self._index_remove(shard, doc)
+            shard.docs.pop(doc["_id"], None)
+            self._locations.pop(doc["_id"], None)
+
+    def _get(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        key = self._locations.get(doc_id, _MISSING)
+        if key is _MISSING:
+            return None
+        shard = self._shards.get(key)
+        return shard.docs.get(doc_id) if shard is not None else None
+
+    def _iter_docs(self) -> Iterator[Dict[str, Any]]:
+        """Yield copies of every document, one shard at a time"""
+        for shard in list(self._shards.values()):
+            with shard.lock:
+                docs = [dict(doc) for doc in shard.docs.values()]
+            yield from docs
+
+    def _journal(self, op: str, doc_id: Any, payload: Optional[Dict[str, Any]] = None):
+        if self.journal is not None:
+            self.journal.record(self.collection_name, op, doc_id, payload)
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """Register a change listener, the in-process counterpart of a change stream.
+
+        Listeners run inside the shard lock right after each write made
+        through the collection API (journal replay is not reported), so they
+        see a shard's changes in order and must not block. Each gets its
+        own copy of the document.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, op: str, doc: Dict[str, Any]):
+        for listener in self._listeners:
+            listener(self.collection_name, op, dict(doc))
+
+    # Collection API
+    def insert_one(self, document: Dict[str, Any]) -> Any:
+        doc_id = self._next_id()
+        document["_id"] = doc_id
+        stored = dict(document)
+        key = self._key_for(stored)
+        shard = self._shard(key)
+        with shard.lock:
+            shard.docs[doc_id] = stored
+            self._index_add(shard, stored)
+            self._locations[doc_id] = key
+            self._journal("i", doc_id, stored)
+            if self._listeners:
+                self._notify("insert", stored)
+        return _result(inserted_id=doc_id)
+
+    def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> Any:
+        """Insert a batch, taking each shard's lock once for all its documents.
+
+        Unlike insert_one, an _id the document already has is kept (as
+        MongoDB does), so bulk loads can use deterministic ids; a duplicate
+        fails like pymongo, with a BulkWriteError. The ordered index is
+        extended and re-sorted once per shard instead of an insort per
+        document.
+        """
+        by_shard: Dict[Any, List[Dict[str, Any]]] = {}
+        inserted_ids = []
+        given_ids = set()
+        errors = []
+        locations = self._locations
+        shard_key = self.shard_key
+        for index, document in enumerate(documents):
+            doc_id = document.get("_id")
+            if doc_id is None:
+                doc_id = document["_id"] = self._next_id()
+            elif doc_id in locations or doc_id in given_ids:
+                errors.append({"index": index, "code": 11000, "errmsg": f"duplicate key: _id {doc_id!r}", "op": document})
+                if ordered:
+                    break
+                continue
+            else:
+                given_ids.add(doc_id)
+            stored = dict(document)
+            key = stored.get(shard_key) if shard_key is not None else None
+            if type(key) is not str and not _hashable(key):  # _key_for(), minus the call for the usual str
+                key = None
+            docs = by_shard.get(key)
+            if docs is None:
+                docs = by_shard[key] = []
+            docs.append(stored)
+            inserted_ids.append(doc_id)
+
+        journal = self.journal
+        for key, docs in by_shard.items():
+            shard = self._shard(key)
+            with shard.lock:
+                self._place_batch(shard, key, docs)
+                if journal is not None:
+                    for doc in docs:
+                        journal.record(self.collection_name, "i", doc["_id"], doc)
+                if self._listeners:
+                    for doc in docs:
+                        self._notify("insert", doc)
+        if errors:
+            raise BulkWriteError({"nInserted": len(inserted_ids), "writeErrors": errors,
+                                  "writeConcernErrors": [], "upserted": []})
+        return _result(acknowledged=True, inserted_ids=inserted_ids)
+
+    def find_one(self, query: Dict[str, Any]) -> Any:
+        for shard in self._shards_for(query):
+            with shard.lock:
+                doc = self._first_match(shard, query)
+                if doc is not None:
+                    return dict(doc)
+        return None
+
+    def find(self, query: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        query = query or {}
+        results = []
+        for shard in self._shards_for(query):
+            with shard.lock:
+                results.extend(dict(doc) for doc in self._candidates(shard, query) if self._matches(doc, query))
+        return results
+
+    def find_ordered(self, query: Dict[str, Any], after: Optional[tuple] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Matching documents in (order_by, _id) order, strictly after the
+        (value, _id) key ``after``, reading at most ``limit`` matches.
+
+        Walks the per-shard sorted index from the bisected start position, so
+        a page costs O(log n + page) rather than a scan and sort of the set.
+        """
+        if self.order_by is None:
+            raise ValueError(f"{self.collection_name} has no ordered index")
+        # Range conditions on the order field narrow the walk to a slice
+        lower = upper = None
+        upper_inclusive = True
+        condition = query.get(self.order_by)
+        if isinstance(condition, dict):
+            for op in ("$gte", "$gt"):
+                if op in condition:
+                    lower = (order_value(condition[op]),)
+            for op in ("$lte", "$lt"):
+                if op in condition:
+                    upper, upper_inclusive = order_value(condition[op]), op == "$lte"
+        after_key = (order_value(after[0]), after[1]) if after is not None else None
+
+        results = []
+        shards = self._shards_for(query)
+        for shard in shards:
+            with shard.lock:
+                start = 0
+                if lower is not None:
+                    start = bisect.bisect_left(shard.order, lower)
+                if after_key is not None:
+                    start = max(start, bisect.bisect_right(shard.order, after_key))
+                matched = 0
+                for position in range(start, len(shard.order)):
+                    key = shard.order[position]
+                    if upper is not None and (key[0] > upper or (key[0] == upper and not upper_inclusive)):
+                        break
+                    doc = shard.docs[key[1]]
+                    if not self._matches(doc, query):
+                        continue
+                    results.append(dict(doc))
+                    matched += 1
+                    if limit is not None and matched >= limit:
+                        break
+        if len(shards) > 1:
+            results.sort(key=self._order_key)
+            if limit is not None:
+                del results[limit:]
+        return results
+
+    def count_documents(self, query: Dict[str, Any]) -> int:
+        total = 0
+        for shard in self._shards_for(query):
+            with shard.lock:
+                if not query:
+                    total += len(shard.docs)
+                else:
+                    total += sum(1 for doc in self._candidates(shard, query) if self._matches(doc, query))
+        return total
+
+    def delete_many(self, query: Dict[str, Any]) -> Any:
+        deleted = 0
+        for shard in self._shards_for(query):
+            with shard.lock:
+                for doc in [doc for doc in self._candidates(shard, query) if self._matches(doc, query)]:
+                    self._index_remove(shard, doc)
+                    del shard.docs[doc["_id"]]
+                    self._locations.pop(doc["_id"], None)
+                    self._journal("d", doc["_id"])
+                    if self._listeners:
+                        self._notify("delete", doc)
+                    deleted += 1
+        return _result(deleted_count=deleted)
+
+    def _update_doc(self, shard: _Shard, doc: Dict[str, Any], update: Dict[str, Any]) -> Tuple[bool, bool]:
+        """Apply an update to a matched document (caller holds the shard lock).
+
+        Returns (modified, moved); a moved document must be _place()d once
+        the lock is released, as with _set_fields().
+        """
+        changes = update_changes(doc, update)
+        changes = {k: v for k, v in changes.items() if k not in doc or doc[k] != v}
+        if not changes:
+            return False, False
+        moved = self._set_fields(shard, doc, changes)
+        self._journal("u", doc["_id"], changes)
+        if self._listeners:
+            self._notify("update", doc)
+        return True, moved
+
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        for shard in self._shards_for(query):
+            with shard.lock:
+                doc = self._first_match(shard, query)
+                if doc is None:
+                    continue
+                modified, moved = self._update_doc(shard, doc, update)
+            if moved:
+                self._place(doc)
+            return _result(matched_count=1, modified_count=int(modified))
+        return _result(matched_count=0, modified_count=0)
+
+    def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        matched = modified = 0
+        for shard in self._shards_for(query):
+            moved_docs = []
+            with shard.lock:
+                for doc in [doc for doc in self._candidates(shard, query) if self._matches(doc, query)]:
+                    changed, moved = self._update_doc(shard, doc, update)
+                    matched += 1
+                    modified += changed
+                    if moved:
+                        moved_docs.append(doc)
+            for doc in moved_docs:
+                self._place(doc)
+        return _result(matched_count=matched, modified_count=modified)
+
+    def delete_one(self, query: Dict[str, Any]) -> Any:
+        for shard in self._shards_for(query):
+            with shard.lock:
+                doc = self._first_match(shard, query)
+                if doc is None:
+                    continue
+                self._index_remove(shard, doc)
+                del shard.docs[doc["_id"]]
+                self._locations.pop(doc["_id"], None)
+                self._journal("d", doc["_id"])
+                if self._listeners:
+                    self._notify("delete", doc)
+            return _result(deleted_count=1)
+        return _result(deleted_count=0)
+
+    def _batch_shard(self, requests: List[Any]) -> Optional[_Shard]:
+        """The one shard every request targets, if there is exactly one"""
+        if self.shard_key is None:
+            return None
+        keys = set()
+        for request in requests:
+            if isinstance(request, InsertOne):
+                keys.add(self._key_for(request._doc))
+                continue
+            query = request._filter
+            if self.shard_key not in query or not _hashable(query[self.shard_key]):
+                return None
+            if isinstance(request, UpdateOne) and self.shard_key in request._doc.get("$set", {}):
+                return None  # would move documents to another shard mid-batch
+            keys.add(query[self.shard_key])
+        return self._shard(keys.pop()) if len(keys) == 1 else None
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True) -> Any:
+        """Apply pymongo InsertOne/UpdateOne/DeleteOne requests in one call.
+
+        When the whole batch lands in one shard (the usual case: one user's
+        tasks) its lock is taken once for the batch, so readers see either
+        none or all of it. Failures are reported like pymongo, as a
+        BulkWriteError carrying the index of each failed request.
+        """
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0}
+        errors = []
+        shard = self._batch_shard(requests)
+        with shard.lock if shard is not None else nullcontext():
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self.insert_one(request._doc)
+                        counts["nInserted"] += 1
+                    elif isinstance(request, UpdateOne):
+                        result = self.update_one(request._filter, request._doc)
+                        counts["nMatched"] += result.matched_count
+                        counts["nModified"] += result.modified_count
+                    elif isinstance(request, DeleteOne):
+                        counts["nRemoved"] += self.delete_one(request._filter).deleted_count
+                    else:
+                        raise TypeError(f"Unsupported bulk request: {type(request).__name__}")
+                except Exception as e:
+                    errors.append({"index": index, "code": 2, "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({**counts, "writeErrors": errors, "writeConcernErrors": [], "upserted": []})
+        return _result(
+            acknowledged=True,
+            inserted_count=counts["nInserted"],
+            matched_count=counts["nMatched"],
+            modified_count=counts["nModified"],
+            deleted_count=counts["nRemoved"],
+            upserted_count=0,
+            bulk_api_result=counts,
+        )
+
+
+class AsyncMockCursor:
+    """Async iterator over MockCollection results, shaped like Motor's cursor"""
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._docs if length is None else self._docs[:length]
+
+
+class AsyncMockCollection:
+    """Motor-style async interface over a MockCollection.
+
+    Operations only touch memory and hold a shard lock for microseconds, so
+    they run inline on the event loop. When the journal waits for fsync on
+    every write (sync_commit), writes are moved to a worker thread instead.
+    """
+
+    def __init__(self, collection: MockCollection):
+        self.sync = collection
+        self.collection_name = collection.collection_name
+
+    async def _write(self, method, *args):
+        journal = self.sync.journal
+        if journal is not None and journal.sync_commit:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def insert_one(self, document: Dict[str, Any]) -> Any:
+        return await self._write(self.sync.insert_one, document)
+
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> Any:
+        return await self._write(self.sync.insert_many, documents, ordered)
+
+    async def find_one(self, query: Dict[str, Any]) -> Any:
+        return self.sync.find_one(query)
+
+    def find(self, query: Dict[str, Any] = None) -> AsyncMockCursor:
+        return AsyncMockCursor(self.sync.find(query))
+
+    async def find_ordered(self, query: Dict[str, Any], after: Optional[tuple] = None,
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.sync.find_ordered(query, after, limit)
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        return self.sync.count_documents(query)
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        return await self._write(self.sync.update_one, query, update)
+
+    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        return await self._write(self.sync.update_many, query, update)
+
+    async def delete_one(self, query: Dict[str, Any]) -> Any:
+        return await self._write(self.sync.delete_one, query)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True) -> Any:
+        return await self._write(self.sync.bulk_write, requests, ordered)
@@ -0,0 +1,216 @@
+"""
+Request metrics in the Prometheus text format (GET /metrics).
+
+MetricsMiddleware is a plain ASGI middleware (BaseHTTPMiddleware would
+cost more than the whole measurement). Per request it takes two clock
+readings, a few dict lookups and a bisect, all on the event loop thread,
+so the HTTP series need no lock. Series are labelled by route template
+("/api/tasks/{task_id}"), not by raw path, and requests that matched no
+route share the "unmatched" label, so the label set stays bounded.
+
+Exported:
+
+- http_requests_total{method,route,status}
+- http_request_duration_seconds{method,route} histogram (until the
+  response body is complete, so /api/events measures stream lifetime)
+- http_requests_in_flight{route}
+- http_request_exceptions_total{method,route}: unhandled errors
+- http_request_db_calls_total / http_request_db_seconds_total
+  {method,route}: database operations made while serving the route
+  (app/instrumentation.py), divide by http_requests_total for per-request
+- db_operations_total / db_operation_seconds_total{collection,operation}
+- the counters of the caches, hashing pool, rate limiters, token
+  revocation and event hub, read when /metrics is scraped
+"""
+
+import bisect
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from app import instrumentation
+
+# Seconds; chosen around the API's range (cached list hits to bcrypt logins)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED = "unmatched"
+
+
+class _RouteSeries:
+    __slots__ = ("buckets", "sum", "count", "exceptions", "db_calls", "db_seconds", "statuses")
+
+    def __init__(self):
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.exceptions = 0
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.statuses: Dict[int, int] = {}
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.series: Dict[Tuple[str, str], _RouteSeries] = {}
+        # id(scope) -> scope of the requests being served; routed ones carry
+        # their route, so in-flight counts per template are taken at scrape
+        self.active: Dict[int, Dict[str, Any]] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, db_usage: List[float], failed: bool):
+        key = (method, route)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _RouteSeries()
+        series.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.sum += seconds
+        series.count += 1
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        if failed:
+            series.exceptions += 1
+        series.db_calls += db_usage[0]
+        series.db_seconds += db_usage[1]
+
+    def in_flight(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for scope in list(self.active.values()):
+            route = route_template(scope)
+            counts[route] = counts.get(route, 0) + 1
+        return counts
+
+
+request_metrics = RequestMetrics()
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED) if route is not None else UNMATCHED
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        failed = False
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        request_id = id(scope)
+        metrics.active[request_id] = scope
+        usage, token = instrumentation.track_request()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            instrumentation.stop_tracking(token)
+            del metrics.active[request_id]
+            metrics.observe(scope["method"], route_template(scope), status, elapsed, usage, failed)
+
+
+# Exposition
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value: float, **labels):
+        self.lines.append(f"{name}{_labels(**labels) if labels else ''} {_number(value)}")
+
+
+# (name, kind, help, collect) for the series read at scrape time
+_collectors: List[Tuple[str, str, str, Callable[[], Any]]] = []
+
+
+def register_collector(name: str, kind: str, help_text: str, collect: Callable[[], Any]):
+    """
+    Add a series read at scrape time. ``collect`` returns a number, or a
+    list of (labels dict, number) pairs.
+    """
+    _collectors.append((name, kind, help_text, collect))
+
+
+def render_metrics(metrics: RequestMetrics = request_metrics) -> str:
+    out = _Writer()
+    series = sorted(metrics.series.items())
+
+    out.family("http_requests_total", "counter", "HTTP requests by route template and status")
+    for (method, route), s in series:
+        for status, count in sorted(s.statuses.items()):
+            out.sample("http_requests_total", count, method=method, route=route, status=status)
+
+    out.family("http_request_duration_seconds", "histogram", "HTTP request latency by route template")
+    for (method, route), s in series:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), s.buckets):
+            cumulative += count
+            out.sample("http_request_duration_seconds_bucket", cumulative, method=method, route=route, le=_number(bound))
+        out.sample("http_request_duration_seconds_sum", s.sum, method=method, route=route)
+        out.sample("http_request_duration_seconds_count", s.count, method=method, route=route)
+
+    out.family("http_request_exceptions_total", "counter", "Requests that raised an unhandled exception")
+    for (method, route), s in series:
+        out.sample("http_request_exceptions_total", s.exceptions, method=method, route=route)
+
+    out.family("http_requests_in_flight", "gauge", "Requests being served, by route template")
+    for route, count in sorted(metrics.in_flight().items()):
+        out.sample("http_requests_in_flight", count, route=route)
+
+    out.family("http_request_db_calls_total", "counter", "Database operations made while serving requests")
+    for (method, route), s in series:
+        out.sample("http_request_db_calls_total", s.db_calls, method=method, route=route)
+    out.family("http_request_db_seconds_total", "counter", "Time in database operations while serving requests")
+    for (method, route), s in series:
+        out.sample("http_request_db_seconds_total", s.db_seconds, method=method, route=route)
+
+    totals = sorted(instrumentation.operation_totals().items())
+    out.family("db_operations_total", "counter", "Database operations by collection and operation")
+    for (collection, operation), (calls, _) in totals:
+        out.sample("db_operations_total", calls, collection=collection, operation=operation)
+    out.family("db_operation_seconds_total", "counter", "Time in database operations by collection and operation")
+    for (collection, operation), (_, seconds) in totals:
+        out.sample("db_operation_seconds_total", seconds, collection=collection, operation=operation)
+
+    for name, kind, help_text, collect in _collectors:
+        out.family(name, kind, help_text)
+        value = collect()
+        if isinstance(value, list):
+            for labels, number in value:
+                out.sample(name, number, **labels)
+        elif value is not None:
+            out.sample(name, value)
+
+    return "\n".join(out.lines) + "\n"
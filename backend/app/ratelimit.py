@@ -0,0 +1,106 @@
+"""
+In-process admission control for the auth endpoints.
+
+/login and /signup each cost a bcrypt hash, so they are limited per client
+IP and per email address before any database or hashing work is done. Each
+key gets a token bucket: ``burst`` requests straight away, refilled at
+``per_minute``. A request that finds its bucket empty is refused with the
+number of seconds until the next token, which the routes send back as
+Retry-After on a 429.
+
+Buckets live in an LRU capped at ``max_keys``; a bucket pushed out has been
+idle longer than every other one, so forgetting it costs at most one extra
+burst for that client. A check is a dict lookup and a little arithmetic
+under a lock.
+
+Limits are per process. Behind a proxy, set AUTH_TRUST_FORWARDED_FOR so the
+client address is taken from X-Forwarded-For instead of the proxy's.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Tuple
+
+AUTH_RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("AUTH_RATE_LIMIT_IP_PER_MINUTE", "30"))
+AUTH_RATE_LIMIT_IP_BURST = int(os.getenv("AUTH_RATE_LIMIT_IP_BURST", "10"))
+AUTH_RATE_LIMIT_EMAIL_PER_MINUTE = float(os.getenv("AUTH_RATE_LIMIT_EMAIL_PER_MINUTE", "6"))
+AUTH_RATE_LIMIT_EMAIL_BURST = int(os.getenv("AUTH_RATE_LIMIT_EMAIL_BURST", "5"))
+AUTH_RATE_LIMIT_MAX_KEYS = int(os.getenv("AUTH_RATE_LIMIT_MAX_KEYS", "100000"))
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+
+
+class TokenBucketLimiter:
+    def __init__(self, per_minute: float, burst: int, max_keys: int = AUTH_RATE_LIMIT_MAX_KEYS):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens left, monotonic time they were counted)
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token for key. Returns 0 if allowed, else seconds to wait"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, counted = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "per_minute": self.rate * 60,
+                "burst": self.burst,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "keys": len(self._buckets),
+                "max_keys": self.max_keys,
+            }
+
+
+ip_limiter = TokenBucketLimiter(AUTH_RATE_LIMIT_IP_PER_MINUTE, AUTH_RATE_LIMIT_IP_BURST)
+email_limiter = TokenBucketLimiter(AUTH_RATE_LIMIT_EMAIL_PER_MINUTE, AUTH_RATE_LIMIT_EMAIL_BURST)
+
+
+def client_ip(request) -> str:
+    if AUTH_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def admit_auth_request(request, email: str) -> int:
+    """
+    Charge an auth attempt to its client IP and email. Returns 0 if it may
+    proceed, otherwise the Retry-After in whole seconds.
+    """
+    wait = ip_limiter.acquire(client_ip(request))
+    if not wait:
+        wait = email_limiter.acquire((email or "").strip().lower())
+    return math.ceil(wait)
+
+
+def rate_limit_stats() -> dict:
+    return {"ip": ip_limiter.stats(), "email": email_limiter.stats()}
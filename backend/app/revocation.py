@@ -0,0 +1,275 @@
+"""
+Server-side revocation of access tokens (POST /logout, /logout-all).
+
+The revoked_tokens collection is the authoritative store. It holds one
+record per revoked token, keyed "jti:<jti>", and one per logout-all,
+keyed "user:<user_id>" with revoked_before: tokens of that user issued
+(iat) before then are revoked. Each record expires when the tokens it
+covers would have expired anyway (TTL index on MongoDB, pruned here for
+the in-memory store), so the store only holds what can still matter.
+
+Every authenticated request has to be checked, and almost none are
+revoked, so a Bloom filter of the keys sits in front of the store: a
+token whose jti and user are both absent from it (the common case, a few
+microseconds) is not revoked without a database read. Only a filter hit
+is confirmed against the store. Confirmed revocations are cached until the
+token expires, since a revoked token never becomes valid again; a hit that
+turned out not revoked (a false positive, or a token issued after its
+user's logout-all) is remembered for TOKEN_REVOCATION_SYNC_SECONDS, the
+same delay revocations from other processes already have.
+
+The filter is per process. It is loaded from the store at startup,
+topped up with revocations made by other processes every
+TOKEN_REVOCATION_SYNC_SECONDS, and rebuilt without the expired records
+(Bloom filters can't delete) every TOKEN_REVOCATION_REBUILD_SECONDS, when
+it also grows if it has filled up.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import app.database as database
+from app.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REVOCATION_BLOOM_CAPACITY = int(os.getenv("TOKEN_REVOCATION_BLOOM_CAPACITY", "100000"))
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("TOKEN_REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))
+TOKEN_REVOCATION_REBUILD_SECONDS = float(os.getenv("TOKEN_REVOCATION_REBUILD_SECONDS", "600"))
+
+# Records synced from the store are re-read this far back, so one written
+# by another process with a slightly lagging clock isn't skipped
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """Set membership with false positives at about error_rate, never false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _hashes(self, key: str):
+        # Double hashing: the k positions are h1 + i*h2 for two 64-bit
+        # halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, key: str):
+        h1, h2 = self._hashes(key)
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = self._hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def token_key(jti: str) -> str:
+    return f"jti:{jti}"
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    def __init__(self, capacity: int = TOKEN_REVOCATION_BLOOM_CAPACITY,
+                 error_rate: float = TOKEN_REVOCATION_BLOOM_ERROR_RATE):
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        # Confirmed revoked jtis -> True, until the token expires
+        self._confirmed = TTLCache(max_entries=10000, ttl_seconds=86400)
+        # Filter hits the store said were not revoked; cleared by local revocations
+        self._cleared = TTLCache(max_entries=10000, ttl_seconds=TOKEN_REVOCATION_SYNC_SECONDS)
+        self._synced_at: Optional[datetime] = None
+        self.checks = 0
+        self.bloom_hits = 0
+        self.store_lookups = 0
+        self.cleared = 0
+
+    # Writes
+    def _record(self, key: str, user_id: str, expires_at: float, **fields) -> Dict[str, Any]:
+        record = {
+            "key": key,
+            "user_id": user_id,
+            "revoked_at": datetime.utcnow(),
+            "expires_at": datetime.utcfromtimestamp(expires_at),
+            **fields,
+        }
+        with self._lock:
+            self._bloom.add(key)
+        self._cleared.clear()
+        return record
+
+    async def revoke_token(self, jti: str, user_id: str, expires_at: float):
+        """Revoke one token (its jti) until its exp"""
+        collection = await database.get_async_revocation_collection()
+        await collection.insert_one(self._record(token_key(jti), user_id, expires_at))
+
+    async def revoke_user(self, user_id: str, expires_at: float, before: Optional[float] = None):
+        """
+        Revoke every token of the user issued before ``before`` (default:
+        now). ``expires_at`` is the latest exp any of them can have.
+        """
+        before = time.time() if before is None else before
+        collection = await database.get_async_revocation_collection()
+        await collection.insert_one(self._record(user_key(user_id), user_id, expires_at, revoked_before=before))
+
+    # Checks
+    def _suspects(self, claims: Dict[str, Any]):
+        """Store queries for the claims' keys that hit the filter"""
+        self.checks += 1
+        token_query = user_query = None
+        bloom = self._bloom
+        if token_key(claims["jti"]) in bloom:
+            token_query = {"key": token_key(claims["jti"])}
+        if user_key(claims["user_id"]) in bloom:
+            user_query = {"key": user_key(claims["user_id"]), "revoked_before": {"$gt": claims["iat"]}}
+        if token_query or user_query:
+            self.bloom_hits += 1
+        return token_query, user_query
+
+    def _known(self, jti: str) -> Optional[bool]:
+        """Cached answer for a filter hit, if there is one"""
+        if self._confirmed.get(jti):
+            return True
+        if self._cleared.get(jti):
+            return False
+        return None
+
+    def _confirm(self, claims: Dict[str, Any], revoked: bool) -> bool:
+        self.store_lookups += 1
+        if revoked:
+            self._confirmed.put(claims["jti"], True, claims["exp"] - time.time())
+        else:
+            self.cleared += 1
+            self._cleared.put(claims["jti"], True)
+        return revoked
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        """True if the token with these claims (jti, user_id, iat, exp) has been revoked"""
+        token_query, user_query = self._suspects(claims)
+        if token_query is None and user_query is None:
+            return False
+        known = self._known(claims["jti"])
+        if known is not None:
+            return known
+        collection = database.get_revocation_collection()
+        revoked = any(query is not None and collection.find_one(query) is not None
+                      for query in (token_query, user_query))
+        return self._confirm(claims, revoked)
+
+    async def is_revoked_async(self, claims: Dict[str, Any]) -> bool:
+        token_query, user_query = self._suspects(claims)
+        if token_query is None and user_query is None:
+            return False
+        known = self._known(claims["jti"])
+        if known is not None:
+            return known
+        collection = await database.get_async_revocation_collection()
+        revoked = False
+        for query in (token_query, user_query):
+            if query is not None and await collection.find_one(query) is not None:
+                revoked = True
+                break
+        return self._confirm(claims, revoked)
+
+    # Maintenance (blocking; run in a worker thread)
+    def sync(self):
+        """Add revocations made by other processes since the last sync"""
+        since = self._synced_at
+        self._synced_at = datetime.utcnow()
+        query = {"revoked_at": {"$gt": since - _SYNC_OVERLAP}} if since else {}
+        records = database.get_revocation_collection().find(query)
+        with self._lock:
+            for record in records:
+                self._bloom.add(record["key"])
+
+    def rebuild(self):
+        """Reload the filter from the unexpired records, growing it if it is full"""
+        collection = database.get_revocation_collection()
+        now = datetime.utcnow()
+        if database.USE_MONGODB is False:
+            # MongoDB's TTL index does this for the real store
+            collection.delete_many({"expires_at": {"$lte": now}})
+        self._synced_at = now
+        records = [record for record in collection.find({}) if record["expires_at"] > now]
+        capacity = self._bloom.capacity
+        while len(records) > capacity // 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity, self.error_rate)
+        for record in records:
+            bloom.add(record["key"])
+        with self._lock:
+            # Keys added while the store was being read are carried over by
+            # the next sync (its window overlaps this read)
+            self._bloom = bloom
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "store_lookups": self.store_lookups,
+            "cleared": self.cleared,
+            "bloom_keys": self._bloom.count,
+            "bloom_capacity": self._bloom.capacity,
+            "bloom_bytes": len(self._bloom._bits),
+        }
+
+
+revocations = RevocationList()
+_maintenance_task = None
+
+
+async def _maintain():
+    rebuilt = time.monotonic()
+    while True:
+        await asyncio.sleep(TOKEN_REVOCATION_SYNC_SECONDS)
+        try:
+            if time.monotonic() - rebuilt >= TOKEN_REVOCATION_REBUILD_SECONDS:
+                await asyncio.to_thread(revocations.rebuild)
+                rebuilt = time.monotonic()
+            else:
+                await asyncio.to_thread(revocations.sync)
+        except Exception:
+            logger.exception("Token revocation sync failed")
+
+
+async def start_revocations():
+    """Load the filter from the store and keep it current (called from the app lifespan)"""
+    global _maintenance_task
+    await asyncio.to_thread(revocations.rebuild)
+    if _maintenance_task is None and TOKEN_REVOCATION_SYNC_SECONDS > 0:
+        _maintenance_task = asyncio.create_task(_maintain())
+
+
+async def stop_revocations():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
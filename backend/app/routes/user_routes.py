@@ -2,10 +2,10 @@ from fastapi import APIRouter, HTTPException
 from app.models.user import User
 from app.database import users_collection
 from app.auth import create_access_token
-from passlib.context import CryptContext
+from app.hashing import password_hasher
+import bcrypt
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.post("/signup")
 def signup(user: User):
@@ -16,8 +16,9 @@ def signup(user: User):
             raise HTTPException(status_code=400, detail="User with this email already exists")
 
         # Truncate password to 72 bytes before hashing
-        safe_password = user.password[:72]
-        hashed_password = pwd_context.hash(safe_password)
+        safe_password = user.password.encode("utf-8")[:72]
+        # Same calibrated cost as routes/auth_routes.py
+        hashed_password = bcrypt.hashpw(safe_password, bcrypt.gensalt(password_hasher.cost))
 
         # Convert to dict and replace password
         user_dict = user.model_dump()
@@ -45,8 +46,11 @@ def login_user(user: User):
         raise HTTPException(status_code=404, detail="User not found")
 
     # Truncate password before verifying
-    safe_password = user.password[:72]
-    if not pwd_context.verify(safe_password, existing_user["password"]):
+    safe_password = user.password.encode("utf-8")[:72]
+    stored = existing_user["password"]
+    if isinstance(stored, str):  # hashes written by passlib
+        stored = stored.encode("ascii")
+    if not bcrypt.checkpw(safe_password, stored):
         raise HTTPException(status_code=401, detail="Incorrect password")
 
     token = create_access_token({"email": existing_user["email"]})
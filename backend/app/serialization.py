@@ -0,0 +1,48 @@
+"""
+Single-pass JSON encoding of MongoDB documents.
+
+dumps() turns documents straight from a collection (ObjectId, datetime,
+bytes included) into JSON bytes in one pass, so list endpoints can return
+them as a raw Response. The alternative is converting each document in
+Python, letting FastAPI's jsonable_encoder walk the result again, and only
+then calling json.dumps.
+
+ObjectId becomes its hex string, datetime its isoformat(), and bytes
+base64. That matches what _serialize_task() and the label helpers produce.
+orjson is used when it is installed; otherwise the stdlib encoder does the
+same job a few times slower.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(value: Any) -> bytes:
+        """Encode documents (or lists of them) to JSON bytes"""
+        return orjson.dumps(value, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(value: Any) -> bytes:
+        """Encode documents (or lists of them) to JSON bytes"""
+        return _encoder.encode(value).encode("utf-8")
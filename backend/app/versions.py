@@ -0,0 +1,65 @@
+"""
+Per-user data versions for conditional GETs.
+
+Every task or label write made through database/task_db.py or the label
+helpers in app/database.py calls bump_version() for the owning user and the
+list it changes ("tasks" or "labels") once the write has completed. The
+list endpoints turn the current version into an ETag and answer
+If-None-Match with 304 without reading the collection; app/cache.py uses
+the same versions to tell whether a cached list is still current.
+
+Versions live in this process only. The ETag includes a random per-process
+epoch, so a restart invalidates every tag that was handed out. Writes made
+by other processes, or directly in the database, are not seen here; when
+the process switches stores, app/database.py calls invalidate_all().
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+_EPOCH = os.urandom(4).hex()
+_versions: Dict[Tuple[str, str], int] = {}
+# Version of every key not bumped since the last invalidate_all()
+_floor = 0
+_lock = threading.Lock()
+
+
+def bump_version(user_id: str, resource: str) -> int:
+    key = (user_id, resource)
+    with _lock:
+        version = _versions[key] = _versions.get(key, _floor) + 1
+    return version
+
+
+def current_version(user_id: str, resource: str) -> int:
+    return _versions.get((user_id, resource), _floor)
+
+
+def invalidate_all():
+    """Move every list past any version handed out so far, and every ETag with it"""
+    global _EPOCH, _floor
+    with _lock:
+        _floor = max([_floor, *_versions.values()]) + 1
+        _versions.clear()
+        _EPOCH = os.urandom(4).hex()
+
+
+def list_etag(user_id: str, resource: str) -> str:
+    """Strong ETag for one of the user's list resources ("tasks", "labels")"""
+    return f'"{resource}-{_EPOCH}-{current_version(user_id, resource)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value covers the ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Fan-out cost of the /api/events hub with many open streams.
+
+Runs the EventHub in-process with one consumer task per connection (what
+each SSE response does) and measures:
+
+  same-user   : every connection belongs to one user, so each event is
+                delivered to all of them (worst case per event)
+  per-user    : one connection per user, events spread across users
+  slow        : a share of the connections never read; checks that their
+                backlog stays capped by EVENT_QUEUE_SIZE and that the other
+                connections still get every event
+
+The HTTP layer is left out: socket buffers would hide slow consumers.
+
+Usage: python benchmarks/event_fanout.py [--connections 10000] [--events 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import events
+from app.events import EventHub, KEEPALIVE_FRAME, RESYNC_FRAME
+
+TASK = {
+    "_id": "mock_id_0",
+    "title": "Write the quarterly report",
+    "priority": "High",
+    "deadline": datetime(2025, 1, 1),
+    "labels": ["work"],
+    "completed": False,
+}
+
+
+async def _consume(subscription, expected: int, received: list, finished: asyncio.Event, remaining: list):
+    count = 0
+    while count < expected:
+        frame = await subscription.next_frame(60)
+        if frame is KEEPALIVE_FRAME:
+            continue
+        count += 1
+        if frame is RESYNC_FRAME:
+            break
+    received.append(count)
+    remaining[0] -= 1
+    if remaining[0] == 0:
+        finished.set()
+
+
+async def _run(hub: EventHub, users, event_count: int, event_users, slow_every: int = 0):
+    hub.bind(asyncio.get_running_loop())
+    per_user = {}
+    for user in users:
+        per_user[user] = per_user.get(user, 0) + 1
+    expected = {user: sum(1 for target in event_users(event_count) if target == user) for user in per_user}
+
+    finished = asyncio.Event()
+    received = []
+    subscriptions, consumers = [], []
+    remaining = [0]
+    for index, user in enumerate(users):
+        subscription = hub.subscribe(user)
+        subscriptions.append(subscription)
+        if slow_every and index % slow_every == 0:
+            continue  # never reads
+        remaining[0] += 1
+        consumers.append(asyncio.create_task(_consume(subscription, expected[user], received, finished, remaining)))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for offset, user in enumerate(event_users(event_count)):
+        hub.publish(user, "task.updated", {**TASK, "_id": f"mock_id_{offset}"})
+        if offset % 50 == 0:
+            await asyncio.sleep(0)  # let consumers drain, as a real loop would
+    await finished.wait()
+    elapsed = time.perf_counter() - start
+
+    backlog = max((len(s._frames) for s in subscriptions), default=0)
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    for consumer in consumers:
+        consumer.cancel()
+    return elapsed, sum(received), backlog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+    n, e = args.connections, args.events
+
+    elapsed, delivered, _ = asyncio.run(_run(EventHub(), ["user"] * n, e, lambda count: ["user"] * count))
+    print(f"same-user  {n:>6} conns x {e} events: {elapsed * 1000:>8.1f} ms, "
+          f"{delivered / elapsed:>12,.0f} deliveries/s, {elapsed / e * 1e3:.2f} ms per event")
+
+    users = [f"user{i}" for i in range(n)]
+    events_total = e * 50
+    elapsed, delivered, _ = asyncio.run(_run(
+        EventHub(), users, events_total, lambda count: [users[i % n] for i in range(count)]))
+    print(f"per-user   {n:>6} conns x {events_total} events: {elapsed * 1000:>8.1f} ms, "
+          f"{delivered / elapsed:>12,.0f} deliveries/s, {elapsed / events_total * 1e6:.1f} us per event")
+
+    burst = events.EVENT_QUEUE_SIZE * 4
+    tracemalloc.start()
+    elapsed, delivered, backlog = asyncio.run(_run(
+        EventHub(), ["user"] * n, burst, lambda count: ["user"] * count, slow_every=10))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fast = n - (n + 9) // 10
+    print(f"slow 10%   {n:>6} conns x {burst} events: fast consumers got {delivered / fast:.0f}/{burst} each, "
+          f"largest backlog {backlog} frames (cap {events.EVENT_QUEUE_SIZE}), peak {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
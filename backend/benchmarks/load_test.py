@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of app.main:app, in-process.
+
+Requests go through httpx's ASGITransport into the real app (its lifespan,
+middleware, auth, routes and the in-memory store), so no server, socket or
+MongoDB is needed. The run is a sequence of phases, each a batch of
+requests issued by --concurrency workers:
+
+  signup, login                    one per user
+  create_task                      --tasks per user
+  list_tasks                       --reads pages of 50 per user
+  update_task, assign_labels       one per task
+  create_label                     --labels per user
+  list_labels                      --reads per user
+  delete_task                      one per task
+
+Each phase reports throughput and p50/p95/p99 latency; non-2xx responses
+count as errors. --output writes the results as JSON, --save-baseline
+stores them for later runs, and --baseline compares against stored ones:
+the run fails (exit 1) when a phase's throughput drops, or its p95 rises,
+by more than --tolerance. Baselines only compare on the same machine and
+settings, so record one where the comparison will run.
+
+bcrypt runs at --bcrypt-cost (default 4) so auth phases measure the app
+rather than the hash, and the auth rate limits are off. --mongo uses
+MONGO_URI instead of the in-memory store. Needs httpx
+(pip install -r requirements-dev.txt).
+
+Usage: python benchmarks/load_test.py [--users 50] [--tasks 20] [--concurrency 32]
+                                      [--output results.json] [--baseline base.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRIORITIES = ("High", "Medium", "Low")
+
+
+class Phase:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "seconds": round(self.elapsed, 3),
+            "throughput": round(len(ordered) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        }
+
+
+async def _run_phase(name: str, calls: List[Callable[[], Awaitable[Any]]], concurrency: int) -> Phase:
+    """Issue the calls from `concurrency` workers; each returns an httpx response"""
+    phase = Phase(name)
+    pending = iter(calls)
+
+    async def worker():
+        for call in pending:
+            started = time.perf_counter()
+            response = await call()
+            phase.latencies.append(time.perf_counter() - started)
+            if response.status_code >= 300:
+                phase.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    phase.elapsed = time.perf_counter() - started
+    return phase
+
+
+async def _load(args) -> List[Phase]:
+    import httpx
+    from app import database
+    from app.main import app
+
+    if not args.mongo:
+        database._use_memory_store()
+
+    rng = random.Random(args.seed)
+    start_day = datetime(2025, 1, 1)
+    users = [{"username": f"user{i}", "email": f"user{i}@bench.test", "password": f"password-{i}"}
+             for i in range(args.users)]
+    # One run can't collide with the previous one's users on a persistent store
+    run = f"{int(time.time())}"
+    for user in users:
+        user["email"] = f"{run}.{user['email']}"
+    headers: Dict[str, Dict[str, str]] = {}
+    task_ids: Dict[str, List[str]] = {}
+    label_names: Dict[str, List[str]] = {}
+    phases: List[Phase] = []
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def phase(name, calls):
+                result = await _run_phase(name, calls, args.concurrency)
+                phases.append(result)
+                print(f"  {name:<14} {len(calls):>7} requests in {result.elapsed:6.2f}s", file=sys.stderr)
+
+            await phase("signup", [lambda u=u: client.post("/signup", json=u) for u in users])
+
+            async def login(user):
+                response = await client.post("/login", json={"email": user["email"], "password": user["password"]})
+                if response.status_code == 200:
+                    headers[user["email"]] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+                return response
+            await phase("login", [lambda u=u: login(u) for u in users])
+            authed = [email for email in (u["email"] for u in users) if email in headers]
+
+            async def create_task(email, n):
+                response = await client.post("/api/tasks", headers=headers[email], json={
+                    "title": f"Task {n}",
+                    "description": "x" * rng.randint(0, args.description_size),
+                    "priority": rng.choice(PRIORITIES),
+                    "deadline": (start_day + timedelta(days=rng.randint(0, 365))).isoformat(),
+                })
+                if response.status_code == 200:
+                    task_ids.setdefault(email, []).append(response.json()["task_id"])
+                return response
+            await phase("create_task", [lambda e=e, n=n: create_task(e, n) for e in authed for n in range(args.tasks)])
+
+            await phase("list_tasks", [lambda e=e: client.get("/api/tasks", params={"limit": 50}, headers=headers[e])
+                                       for e in authed for _ in range(args.reads)])
+            await phase("update_task", [
+                lambda e=e, t=t: client.put(f"/api/tasks/{t}", json={"completed": True}, headers=headers[e])
+                for e in authed for t in task_ids.get(e, [])
+            ])
+
+            async def create_label(email, n):
+                name = f"label-{n}"
+                response = await client.post("/api/labels", json={"name": name}, headers=headers[email])
+                if response.status_code == 200:
+                    label_names.setdefault(email, []).append(name)
+                return response
+            await phase("create_label", [lambda e=e, n=n: create_label(e, n) for e in authed for n in range(args.labels)])
+            await phase("list_labels", [lambda e=e: client.get("/api/labels", headers=headers[e])
+                                        for e in authed for _ in range(args.reads)])
+            await phase("assign_labels", [
+                lambda e=e, t=t: client.patch(
+                    f"/api/tasks/{t}/labels", headers=headers[e],
+                    json={"labels": rng.sample(label_names.get(e, []), min(2, len(label_names.get(e, []))))},
+                )
+                for e in authed for t in task_ids.get(e, [])
+            ])
+            await phase("delete_task", [lambda e=e, t=t: client.delete(f"/api/tasks/{t}", headers=headers[e])
+                                        for e in authed for t in task_ids.get(e, [])])
+    return phases
+
+
+def _compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["phases"].items():
+        previous = baseline.get("phases", {}).get(name)
+        if previous is None:
+            continue
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']}/s vs baseline {previous['throughput']}/s")
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms vs baseline {previous['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=20, help="tasks per user")
+    parser.add_argument("--labels", type=int, default=5, help="labels per user")
+    parser.add_argument("--reads", type=int, default=5, help="list requests per user and list")
+    parser.add_argument("--description-size", type=int, default=200, help="max task description length")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bcrypt-cost", type=int, default=4)
+    parser.add_argument("--mongo", action="store_true", help="use MONGO_URI instead of the in-memory store")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="fail on regression against these results")
+    parser.add_argument("--save-baseline", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop / p95 rise (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Read when the app is imported
+    os.environ["PASSWORD_HASH_COST"] = str(args.bcrypt_cost)
+    os.environ.setdefault("AUTH_RATE_LIMIT_IP_PER_MINUTE", "0")
+    os.environ.setdefault("AUTH_RATE_LIMIT_EMAIL_PER_MINUTE", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.mongo:
+        os.environ["DB_HEALTH_CHECK_INTERVAL"] = "0"  # don't fail back to a MongoDB that happens to be up
+
+    phases = asyncio.run(_load(args))
+    results = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "settings": {name: getattr(args, name) for name in
+                     ("users", "tasks", "labels", "reads", "description_size", "concurrency", "seed", "bcrypt_cost", "mongo")},
+        "phases": {phase.name: phase.summary() for phase in phases},
+    }
+
+    print(f"{'phase':<14} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, s in results["phases"].items():
+        print(f"{name:<14} {s['requests']:>8} {s['errors']:>6} {s['throughput']:>9.1f} "
+              f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    failed = False
+    errors = sum(s["errors"] for s in results["phases"].values())
+    if errors:
+        print(f"FAIL: {errors} requests returned an error status")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            print("warning: baseline was recorded with different settings")
+        regressions = _compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            failed = True
+        else:
+            print(f"No regression beyond {args.tolerance:.0%} of {args.baseline}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
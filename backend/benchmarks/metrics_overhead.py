@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of MetricsMiddleware.
+
+Calls a minimal FastAPI app straight through ASGI (no sockets), with and
+without the middleware, and reports the difference per request. The
+endpoint makes one in-memory find_one through an instrumented collection,
+so the DB accounting is included.
+
+Usage: python benchmarks/metrics_overhead.py [--requests 20000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+
+from app.instrumentation import instrument
+from app.memory_store import MockCollection
+from app.metrics import MetricsMiddleware, RequestMetrics
+
+
+def _app(with_metrics: bool):
+    users = instrument(MockCollection("users", indexes=("email",)), "users")
+    users.insert_one({"email": "a@example.com"})
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        users.find_one({"email": "a@example.com"})
+        return {"id": item_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+    return app
+
+
+async def _run(app, count: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/42", "raw_path": b"/items/42", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    plain, measured = _app(False), _app(True)
+    best = {"plain": float("inf"), "metrics": float("inf")}
+    for _ in range(args.repeat):
+        # Alternate so drift affects both equally
+        best["plain"] = min(best["plain"], asyncio.run(_run(plain, args.requests)))
+        best["metrics"] = min(best["metrics"], asyncio.run(_run(measured, args.requests)))
+
+    per_plain = best["plain"] / args.requests * 1e6
+    per_metrics = best["metrics"] / args.requests * 1e6
+    print(f"without middleware: {per_plain:7.1f} µs/request")
+    print(f"with middleware:    {per_metrics:7.1f} µs/request")
+    print(f"overhead:           {per_metrics - per_plain:7.1f} µs/request (best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Lookup latency benchmark for the in-memory MockCollection fallback store.
+
+Fills the store with 1k..1M documents and times the equality queries the API
+issues on every request. With the hash indexes the per-lookup latency should
+stay flat as the collection grows.
+
+Usage: python benchmarks/mock_store_lookups.py [--max 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.memory_store import MockCollection
+
+TASKS_PER_USER = 50
+
+
+def _time_per_call(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def run(size: int, samples: int = 2000):
+    users = MockCollection("users", indexes=("email",))
+    tasks = MockCollection("tasks", indexes=(), shard_key="user_id")
+
+    user_ids = [
+        users.insert_one({"username": f"user{i}", "email": f"user{i}@example.com", "password": b"x"}).inserted_id
+        for i in range(size)
+    ]
+    num_users = max(1, size // TASKS_PER_USER)
+    for i in range(size):
+        tasks.insert_one({
+            "title": f"task {i}",
+            "priority": "Medium",
+            "deadline": datetime(2025, 1, 1),
+            "user_id": user_ids[i % num_users],
+        })
+
+    rng = random.Random(42)
+    ids = [rng.choice(user_ids) for _ in range(samples)]
+    emails = [f"user{rng.randrange(size)}@example.com" for _ in range(samples)]
+    owners = [user_ids[rng.randrange(num_users)] for _ in range(samples)]
+
+    return {
+        "find_one _id": _time_per_call(lambda i: users.find_one({"_id": i}), ids),
+        "find_one email": _time_per_call(lambda e: users.find_one({"email": e}), emails),
+        "find user_id (k=50)": _time_per_call(lambda u: tasks.find({"user_id": u}), owners),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max", type=int, default=1_000_000, help="largest collection size to test")
+    args = parser.parse_args()
+
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= args.max]
+    print(f"{'documents':>10} | {'find_one _id':>14} | {'find_one email':>14} | {'find user_id (k=50)':>20}")
+    print("-" * 68)
+    for size in sizes:
+        results = run(size)
+        print(f"{size:>10,} | {results['find_one _id']:>11.2f} us | {results['find_one email']:>11.2f} us "
+              f"| {results['find user_id (k=50)']:>17.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Cost of turning a task list into a JSON response body.
+
+  before : _serialize_task() per document, FastAPI's jsonable_encoder over
+           the result, then JSONResponse.render() (stdlib json.dumps)
+  after  : app.serialization.dumps() on the documents as the driver
+           returns them (ObjectId _id, datetime fields), in one pass
+
+Both produce the same JSON. The documents are copied before each run, as a
+fresh query result would be.
+
+Usage: python benchmarks/serialization.py [--sizes 1000 10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import serialization
+from database.task_db import _serialize_task
+
+
+def _tasks(count: int):
+    start = datetime(2025, 1, 1, 9, 30)
+    user_id = str(ObjectId())
+    return [{
+        "_id": ObjectId(),
+        "title": f"Task {i}",
+        "description": "Follow up with the team about the quarterly planning doc",
+        "priority": ("High", "Medium", "Low")[i % 3],
+        "deadline": start + timedelta(days=i % 365),
+        "start_time": "09:00",
+        "end_time": "10:00",
+        "labels": ["work", "planning"] if i % 2 else [],
+        "completed": i % 5 == 0,
+        "user_id": user_id,
+        "created_at": start + timedelta(seconds=i),
+        "updated_at": start + timedelta(seconds=i, milliseconds=250),
+    } for i in range(count)]
+
+
+def _before(docs):
+    tasks = [_serialize_task(doc) for doc in docs]
+    return JSONResponse(content=jsonable_encoder(tasks)).body
+
+
+def _after(docs):
+    return serialization.dumps(docs)
+
+
+def _time(fn, docs, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        batch = [dict(doc) for doc in docs]
+        start = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    backend = "orjson" if serialization.orjson is not None else "stdlib json"
+    print(f"serialization.dumps backend: {backend}")
+    for size in args.sizes:
+        docs = _tasks(size)
+        assert json.loads(_before([dict(d) for d in docs])) == json.loads(_after([dict(d) for d in docs]))
+        before = _time(_before, docs, args.repeat)
+        after = _time(_after, docs, args.repeat)
+        print(f"{size:>7,} tasks: before {before * 1000:>8.2f} ms  after {after * 1000:>8.2f} ms  "
+              f"({before / after:.1f}x faster, best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Check that every query the API sends to MongoDB is served by an index.
+
+Creates the indexes from app/indexes.py, runs explain() on each query shape
+used by database/task_db.py and the label/user helpers, and exits with
+status 1 if any winning plan is a COLLSCAN. Needs a reachable MONGO_URI.
+"""
+
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import MONGO_URI, _connect_mongodb
+from app.indexes import QUERY_SHAPES, ensure_indexes, find_collscans
+
+def main():
+    try:
+        client = _connect_mongodb()
+    except Exception as e:
+        print(f"FAIL Cannot connect to MongoDB at {MONGO_URI}: {e}")
+        return 1
+
+    database = client["todo_app"]
+    ensure_indexes(database)
+    offenders = find_collscans(database)
+    client.close()
+
+    if offenders:
+        print(f"FAIL {len(offenders)} of {len(QUERY_SHAPES)} query shapes use a COLLSCAN:")
+        for offender in offenders:
+            print(f"   - {offender}")
+        return 1
+    print(f"PASS All {len(QUERY_SHAPES)} query shapes are served by an index")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,309 @@
+from pymongo import ASCENDING, InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
-from pymongo.collection import Collection
 from models.task_model import TaskCreate
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple, List, Dict
+from app.database import build_id_query, get_async_tombstone_collection
+from app.indexes import TASK_TOMBSTONE_RETENTION_SECONDS
+from app.memory_store import AsyncMockCollection
+from app.versions import bump_version, current_version
+from app.cache import list_cache
+from app.serialization import dumps
+import base64
+import json
 
-def create_task(db: Collection, task_data: TaskCreate, user_id: str):
+# Keyset pagination order; backed by the (user_id, deadline, _id) index
+TASK_PAGE_SORT = [("deadline", ASCENDING), ("_id", ASCENDING)]
+
+# The changes feed hands out watermarks this far behind "now", so writes that
+# were still in flight when it was read are sent again on the next poll
+# rather than missed; clients apply changes idempotently.
+TASK_CHANGES_OVERLAP = timedelta(seconds=2)
+
+class InvalidCursor(ValueError):
+    pass
+
+class ChangesExpired(ValueError):
+    """The watermark is older than the tombstone retention; resync from scratch"""
+
+def _new_task_document(task_data: TaskCreate, user_id: str) -> dict:
     task_dict = task_data.dict()
     task_dict["user_id"] = user_id
-    task_dict["created_at"] = datetime.utcnow()
-    result = db.insert_one(task_dict)
+    task_dict["created_at"] = task_dict["updated_at"] = datetime.utcnow()
+    return task_dict
+
+def _serialize_task(task: dict) -> dict:
+    task["_id"] = str(task["_id"])
+    # Serialize datetime objects to ISO format strings
+    if "deadline" in task and isinstance(task["deadline"], datetime):
+        task["deadline"] = task["deadline"].isoformat()
+    if "created_at" in task and isinstance(task["created_at"], datetime):
+        task["created_at"] = task["created_at"].isoformat()
+    if "updated_at" in task and isinstance(task["updated_at"], datetime):
+        task["updated_at"] = task["updated_at"].isoformat()
+    return task
+
+def _tombstone(task_id, user_id: str) -> dict:
+    return {"task_id": str(task_id), "user_id": user_id, "deleted_at": datetime.utcnow()}
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; bring an offset-aware watermark in line"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _changes_window(since: datetime) -> Tuple[datetime, datetime]:
+    """(watermark to hand out, tombstone cutoff) for a changes request"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=TASK_TOMBSTONE_RETENTION_SECONDS)
+    if since is not None and since < cutoff:
+        raise ChangesExpired("Watermark is older than the deleted-task retention; fetch the full list again")
+    watermark = now - TASK_CHANGES_OVERLAP
+    if since is not None and watermark < since:
+        watermark = since  # never move a client's watermark backwards
+    return watermark, cutoff
+
+def encode_cursor(task: dict) -> str:
+    """Opaque cursor pointing just after the given (unserialized) task"""
+    deadline = task.get("deadline")
+    payload = {
+        "d": deadline.isoformat() if isinstance(deadline, datetime) else deadline,
+        "i": str(task["_id"]),
+    }
+    if isinstance(deadline, str):
+        payload["s"] = 1  # a legacy string deadline, see app.database._migrate_string_deadlines
+    if isinstance(task["_id"], ObjectId):
+        payload["o"] = 1
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[object, object]:
+    """Decode a cursor into the (deadline, _id) key it points after"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        deadline = payload["d"]
+        if isinstance(deadline, str) and not payload.get("s"):
+            deadline = datetime.fromisoformat(deadline)
+        doc_id = ObjectId(payload["i"]) if payload.get("o") else payload["i"]
+        return deadline, doc_id
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+def task_filters(deadline_from: Optional[datetime] = None, deadline_to: Optional[datetime] = None,
+                 completed: Optional[bool] = None, priority: Optional[str] = None,
+                 label: Optional[str] = None) -> dict:
+    """Extra query conditions for the task list; deadline range is [from, to)"""
+    filters = {}
+    if deadline_from is not None or deadline_to is not None:
+        filters["deadline"] = {}
+        if deadline_from is not None:
+            filters["deadline"]["$gte"] = deadline_from
+        if deadline_to is not None:
+            filters["deadline"]["$lt"] = deadline_to
+    if completed is not None:
+        filters["completed"] = completed
+    if priority is not None:
+        filters["priority"] = priority
+    if label is not None:
+        filters["labels"] = label  # matches tasks whose labels array contains it
+    return filters
+
+def _task_query(user_id: str, filters: Optional[dict]) -> dict:
+    return {**(filters or {}), "user_id": user_id}
+
+def _page_query(user_id: str, after: Optional[tuple], filters: Optional[dict] = None) -> dict:
+    query = _task_query(user_id, filters)
+    if after is not None:
+        deadline, doc_id = after
+        query["$or"] = [{"deadline": {"$gt": deadline}}, {"deadline": deadline, "_id": {"$gt": doc_id}}]
+        if isinstance(doc_id, str):
+            # Failback leaves the in-memory store's string ids next to
+            # ObjectIds, which sort after every string but never match $gt one
+            query["$or"].append({"deadline": deadline, "_id": {"$type": "objectId"}})
+        if isinstance(deadline, str):
+            # Comparisons only match values of the same type, and dates sort
+            # after strings
+            query["$or"].append({"deadline": {"$type": "date"}})
+            return query
+        # The $gte bound lets the index scan start at the cursor instead of
+        # filtering everything before it
+        deadline_range = dict(query.get("deadline", {}))
+        if "$gte" not in deadline_range or deadline_range["$gte"] < deadline:
+            deadline_range["$gte"] = deadline
+        query["deadline"] = deadline_range
+    return query
+
+def _uses_ordered_index(filters: Optional[dict]) -> bool:
+    # The in-memory store can serve deadline ranges off its sorted index
+    return bool(filters) and "deadline" in filters
+
+def _finish_page(tasks: List[dict], limit: int, raw: bool) -> Tuple[List[dict], Optional[str]]:
+    # One extra row was fetched to tell whether another page exists
+    next_cursor = encode_cursor(tasks[limit - 1]) if len(tasks) > limit else None
+    del tasks[limit:]
+    return (tasks if raw else [_serialize_task(task) for task in tasks]), next_cursor
+
+def _bulk_target_ids(operations: List[dict]) -> list:
+    return list({build_id_query(op["task_id"])["_id"] for op in operations if op["op"] != "create"})
+
+def _plan_bulk(operations: List[dict], user_id: str, existing_ids: set):
+    """Turn bulk operations into write requests plus a result slot per operation.
+
+    Updates and deletes are scoped to the user's own tasks; ones whose task
+    does not exist (or was deleted earlier in the batch) are answered
+    not_found without being sent. Returns (requests, positions, results,
+    new_documents) where positions[i] is the operation index of requests[i]
+    and new_documents maps create operations to the documents they insert.
+    """
+    requests, positions, results = [], [], []
+    new_documents = {}
+    for index, op in enumerate(operations):
+        result = {"index": index, "op": op["op"]}
+        if op["op"] == "create":
+            document = _new_task_document(op["task"], user_id)
+            new_documents[index] = document
+            requests.append(InsertOne(document))
+        else:
+            task_id = build_id_query(op["task_id"])["_id"]
+            result["task_id"] = op["task_id"]
+            if task_id not in existing_ids:
+                result["status"] = "not_found"
+                results.append(result)
+                continue
+            query = {"_id": task_id, "user_id": user_id}
+            if op["op"] == "update":
+                requests.append(UpdateOne(query, {"$set": {**op["updates"], "updated_at": datetime.utcnow()}}))
+            else:
+                existing_ids.discard(task_id)
+                requests.append(DeleteOne(query))
+        positions.append(index)
+        results.append(result)
+    return requests, positions, results, new_documents
+
+def _finish_bulk(results: List[dict], positions: List[int], new_documents: Dict[int, dict],
+                 error: Optional[BulkWriteError]) -> List[dict]:
+    failed = {}
+    first_failure = None
+    if error is not None:
+        for write_error in error.details.get("writeErrors", []):
+            failed[positions[write_error["index"]]] = write_error.get("errmsg", "write failed")
+        first_failure = min(failed) if failed else None
+    done = {"create": "created", "update": "updated", "delete": "deleted"}
+    for index in positions:
+        result = results[index]
+        if index in failed:
+            result["status"], result["error"] = "error", failed[index]
+        elif first_failure is not None and index > first_failure:
+            # Ordered bulk writes stop at the first failure
+            result["status"] = "skipped"
+        else:
+            result["status"] = done[result["op"]]
+            if index in new_documents:
+                result["task_id"] = str(new_documents[index]["_id"])
+    return results
+
+def _bulk_tombstones(results: List[dict], user_id: str) -> list:
+    return [InsertOne(_tombstone(result["task_id"], user_id))
+            for result in results if result.get("status") == "deleted"]
+
+def _filters_key(filters: Optional[dict]) -> str:
+    return repr(sorted(filters.items())) if filters else ""
+
+def _owned_task_query(task_id: str, user_id: str) -> dict:
+    # Handles both MongoDB ObjectId and mock string IDs
+    return {**build_id_query(task_id), "user_id": user_id}
+
+# Async versions for Motor (AsyncIOMotorCollection) or AsyncMockCollection
+async def create_task_async(db, task_data: TaskCreate, user_id: str):
+    result = await db.insert_one(_new_task_document(task_data, user_id))
+    bump_version(user_id, "tasks")
     return str(result.inserted_id)
 
-def get_tasks(db: Collection, user_id: str):
-    tasks = db.find({"user_id": user_id})
-    result = []
-    for task in tasks:
-        task["_id"] = str(task["_id"])
-        # Serialize datetime objects to ISO format strings
-        if "deadline" in task and isinstance(task["deadline"], datetime):
-            task["deadline"] = task["deadline"].isoformat()
-        if "created_at" in task and isinstance(task["created_at"], datetime):
-            task["created_at"] = task["created_at"].isoformat()
-        result.append(task)
-    return result
-
-def update_task(db: Collection, task_id: str, updates: dict):
-    # Handle both MongoDB ObjectId and mock string IDs
-    if task_id.startswith("mock_id_"):
-        db.update_one({"_id": task_id}, {"$set": updates})
+async def _find_tasks_async(db, user_id: str, filters: Optional[dict]) -> List[dict]:
+    query = _task_query(user_id, filters)
+    if isinstance(db, AsyncMockCollection) and _uses_ordered_index(filters):
+        return await db.find_ordered(query)
+    return await db.find(query).to_list(length=None)
+
+async def get_tasks_async(db, user_id: str, filters: Optional[dict] = None):
+    return [_serialize_task(task) for task in await _find_tasks_async(db, user_id, filters)]
+
+async def get_tasks_json_async(db, user_id: str, filters: Optional[dict] = None) -> bytes:
+    """get_tasks_async() as a JSON body, served from the per-user list cache when current.
+
+    Documents are encoded straight from the driver's types (app/serialization.py).
+    """
+    variant = _filters_key(filters)
+    body = list_cache.get(user_id, "tasks", variant)
+    if body is None:
+        version = current_version(user_id, "tasks")
+        body = dumps(await _find_tasks_async(db, user_id, filters))
+        list_cache.put(user_id, "tasks", variant, version, body)
+    return body
+
+async def get_tasks_page_async(db, user_id: str, limit: int, cursor: Optional[str] = None,
+                               filters: Optional[dict] = None, raw: bool = False):
+    """One page of tasks ordered by (deadline, _id); returns (tasks, next_cursor).
+
+    With raw=True the documents are returned as stored, for serialization.dumps().
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if isinstance(db, AsyncMockCollection):
+        tasks = await db.find_ordered(_task_query(user_id, filters), after=after, limit=limit + 1)
     else:
+        query = _page_query(user_id, after, filters)
+        tasks = await db.find(query).sort(TASK_PAGE_SORT).limit(limit + 1).to_list(length=None)
+    return _finish_page(tasks, limit, raw)
+
+async def bulk_write_tasks_async(db, operations: List[dict], user_id: str) -> List[dict]:
+    """Apply create/update/delete operations in order with one bulk_write; per-operation results"""
+    target_ids = _bulk_target_ids(operations)
+    existing = set()
+    if target_ids:
+        existing = {task["_id"] async for task in db.find({"user_id": user_id, "_id": {"$in": target_ids}})}
+    requests, positions, results, new_documents = _plan_bulk(operations, user_id, existing)
+    error = None
+    if requests:
         try:
-            db.update_one({"_id": ObjectId(task_id)}, {"$set": updates})
-        except:
-            db.update_one({"_id": task_id}, {"$set": updates})
+            await db.bulk_write(requests, ordered=True)
+        except BulkWriteError as e:
+            error = e
+        finally:
+            bump_version(user_id, "tasks")
+    results = _finish_bulk(results, positions, new_documents, error)
+    tombstones = _bulk_tombstones(results, user_id)
+    if tombstones:
+        await (await get_async_tombstone_collection()).bulk_write(tombstones, ordered=False)
+    return results
+
+async def update_task_async(db, task_id: str, updates: dict, user_id: str):
+    await db.update_one(_owned_task_query(task_id, user_id), {"$set": {**updates, "updated_at": datetime.utcnow()}})
+    bump_version(user_id, "tasks")
     return True
 
-def delete_task(db: Collection, task_id: str):
-    # Handle both MongoDB ObjectId and mock string IDs
-    if task_id.startswith("mock_id_"):
-        db.delete_one({"_id": task_id})
-    else:
-        try:
-            db.delete_one({"_id": ObjectId(task_id)})
-        except:
-            db.delete_one({"_id": task_id})
+async def delete_task_async(db, task_id: str, user_id: str):
+    query = _owned_task_query(task_id, user_id)
+    if (await db.delete_one(query)).deleted_count:
+        tombstones = await get_async_tombstone_collection()
+        await tombstones.insert_one(_tombstone(query["_id"], user_id))
+    bump_version(user_id, "tasks")
     return True
+
+async def get_task_changes_async(db, user_id: str, since: Optional[datetime] = None) -> dict:
+    """Tasks changed and ids deleted after ``since``, plus the next watermark.
+
+    Without ``since`` every task is returned (the initial sync). An
+    offset-aware ``since`` is read as that instant in UTC.
+    """
+    since = _naive_utc(since)
+    watermark, cutoff = _changes_window(since)
+    if since is None:
+        return {"changed": await get_tasks_async(db, user_id), "deleted": [], "watermark": watermark.isoformat()}
+    tombstones = await get_async_tombstone_collection()
+    if isinstance(tombstones, AsyncMockCollection):
+        tombstones.sync.delete_many({"user_id": user_id, "deleted_at": {"$lt": cutoff}})
+    changed = [_serialize_task(task) async for task in db.find({"user_id": user_id, "updated_at": {"$gt": since}})]
+    deleted = [tombstone["task_id"] async for tombstone in tombstones.find({"user_id": user_id, "deleted_at": {"$gt": since}})]
+    return {"changed": changed, "deleted": deleted, "watermark": watermark.isoformat()}
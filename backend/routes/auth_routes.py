@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, field_validator
+import logging
 import sys
 import os
-import bcrypt
 from datetime import datetime
 from bson import ObjectId
-from jose import jwt
+from pymongo.errors import DuplicateKeyError
+import time
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database import get_user_collection
+from app.database import get_async_user_collection
+from app.hashing import HashingBusy, hash_password, check_password, rehash_password, password_hasher, PASSWORD_HASH_RETRY_AFTER_SECONDS
+from app.auth import invalidate_cached_user, create_access_token, token_claims, get_current_user_async, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.revocation import revocations
+from app.ratelimit import admit_auth_request
 
 # Request models
 class SignupRequest(BaseModel):
@@ -50,12 +56,55 @@ class LoginRequest(BaseModel):
         }
 
 router = APIRouter()
-SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key")
+logger = logging.getLogger("app.auth")
+# /logout accepts a missing or already-invalid token
+optional_token = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
-# Logout route
+def _hashing_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins in progress, try again shortly",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+def _admit(request: Request, email: str):
+    # Before any database or bcrypt work, so refused attempts cost nothing
+    retry_after = admit_auth_request(request, email)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+async def _upgrade_password_hash(db, user_id, password_bytes: bytes, old_hash: bytes):
+    try:
+        if await rehash_password(db, user_id, password_bytes, old_hash):
+            invalidate_cached_user(str(user_id))
+            logger.info("Password rehashed", extra={"user_id": str(user_id), "cost": password_hasher.cost})
+    except Exception:
+        logger.exception("Password rehash failed", extra={"user_id": str(user_id)})
+
+# Logout routes
 @router.post("/logout")
-def logout():
-    return {"message": "Logged out — please delete your token on the frontend"}
+async def logout(token: str = Depends(optional_token)):
+    """Revoke the bearer token, so it stops working before it expires"""
+    if token:
+        try:
+            claims = token_claims(token)
+        except Exception:
+            claims = None  # expired or malformed: nothing left to revoke
+        if claims is not None:
+            await revocations.revoke_token(claims["jti"], claims["user_id"], claims["exp"])
+    return {"message": "Logged out"}
+
+@router.post("/logout-all")
+async def logout_all(current_user=Depends(get_current_user_async)):
+    """Revoke every token issued to the user so far, on all devices"""
+    # Covers tokens until the longest one still valid would have expired
+    expires_at = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    await revocations.revoke_user(current_user["_id"], expires_at)
+    return {"message": "Logged out of all sessions"}
 
 # CORS preflight handlers
 @router.options("/signup")
@@ -68,19 +117,19 @@ def login_options():
 
 # Signup route
 @router.post("/signup")
-def signup(user: SignupRequest, db=Depends(get_user_collection)):
+async def signup(user: SignupRequest, request: Request, db=Depends(get_async_user_collection)):
+    _admit(request, user.email)
     try:
-        print(f"[SIGNUP DEBUG] Received request: username={user.username}, email={user.email}")
-        print(f"[SIGNUP DEBUG] Password length: {len(user.password)} chars, {len(user.password.encode('utf-8'))} bytes")
+        logger.debug("Signup request", extra={"username": user.username, "email": user.email})
         
         # Validate email format
         if not user.email or '@' not in user.email or '.' not in user.email.split('@')[-1]:
-            print(f"[SIGNUP DEBUG] Invalid email format: {user.email}")
+            logger.info("Signup rejected", extra={"reason": "invalid_email"})
             raise HTTPException(status_code=400, detail="Invalid email format")
         
         # Validate password
         if not user.password or len(user.password) < 6:
-            print(f"[SIGNUP DEBUG] Password too short")
+            logger.info("Signup rejected", extra={"reason": "password_too_short"})
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
         
         # Truncate password to 72 bytes (bcrypt limitation)
@@ -88,15 +137,18 @@ def signup(user: SignupRequest, db=Depends(get_user_collection)):
         
         # Validate username
         if not user.username or len(user.username) < 3:
-            print(f"[SIGNUP DEBUG] Username too short")
+            logger.info("Signup rejected", extra={"reason": "username_too_short"})
             raise HTTPException(status_code=400, detail="Username must be at least 3 characters")
         
-        if db.find_one({"email": user.email}):
-            print(f"[SIGNUP DEBUG] Email already registered: {user.email}")
+        if await db.find_one({"email": user.email}):
+            logger.info("Signup rejected", extra={"reason": "email_registered"})
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        # Hash password using bcrypt directly
-        hashed_pw = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
+        # bcrypt is CPU-bound; it runs in the hashing process pool
+        try:
+            hashed_pw = await hash_password(password_bytes)
+        except HashingBusy:
+            raise _hashing_busy()
         
         user_data = {
             "username": user.username,
@@ -104,56 +156,65 @@ def signup(user: SignupRequest, db=Depends(get_user_collection)):
             "password": hashed_pw,
             "created_at": datetime.utcnow()
         }
-        result = db.insert_one(user_data)
-        print(f"[SIGNUP DEBUG] User created successfully: {result.inserted_id}")
+        try:
+            result = await db.insert_one(user_data)
+        except DuplicateKeyError:
+            # Lost a race with a concurrent signup; the unique email index caught it
+            raise HTTPException(status_code=400, detail="Email already registered")
+        logger.info("User created", extra={"user_id": str(result.inserted_id)})
         return {"user_id": str(result.inserted_id), "message": "User created successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[SIGNUP ERROR] Exception occurred: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Signup failed")
         raise HTTPException(status_code=500, detail=f"Signup failed: {str(e)}")
 
 # Login route
 @router.post("/login")
-def login(user: LoginRequest, db=Depends(get_user_collection)):
+async def login(user: LoginRequest, request: Request, background_tasks: BackgroundTasks, db=Depends(get_async_user_collection)):
+    _admit(request, user.email)
     try:
-        print(f"[LOGIN DEBUG] Received request for email: {user.email}")
+        logger.debug("Login request", extra={"email": user.email})
         
         # Validate email format
         if not user.email or '@' not in user.email:
-            print(f"[LOGIN DEBUG] Invalid email format: {user.email}")
+            logger.info("Login rejected", extra={"reason": "invalid_email"})
             raise HTTPException(status_code=400, detail="Invalid email format")
         
         # Validate password
         if not user.password:
-            print(f"[LOGIN DEBUG] Password not provided")
+            logger.info("Login rejected", extra={"reason": "password_missing"})
             raise HTTPException(status_code=400, detail="Password required")
         
         # Truncate password to 72 bytes (bcrypt limitation)
         password_bytes = user.password.encode('utf-8')[:72]
         
-        db_user = db.find_one({"email": user.email})
+        db_user = await db.find_one({"email": user.email})
         
-        # Verify password using bcrypt
-        if not db_user or not bcrypt.checkpw(password_bytes, db_user["password"]):
-            print(f"[LOGIN DEBUG] Invalid credentials for email: {user.email}")
+        # Verify password using bcrypt (in the hashing process pool)
+        try:
+            valid = bool(db_user) and await check_password(password_bytes, db_user["password"])
+        except HashingBusy:
+            raise _hashing_busy()
+        if not valid:
+            logger.info("Login rejected", extra={"reason": "invalid_credentials"})
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
+        # Hashed at an older cost: upgrade it after the response is sent
+        if password_hasher.needs_rehash(db_user["password"]):
+            background_tasks.add_task(_upgrade_password_hash, db, db_user["_id"], password_bytes, db_user["password"])
+        
         # Create token with proper structure
         token_data = {
             "user_id": str(db_user["_id"]), 
             "email": user.email,
             "sub": user.email
         }
-        token = jwt.encode(token_data, SECRET_KEY, algorithm="HS256")
-        print(f"[LOGIN DEBUG] Login successful for: {user.email}")
+        token = create_access_token(token_data)
+        logger.info("Login succeeded", extra={"user_id": str(db_user["_id"])})
         return {"access_token": token, "user_id": str(db_user["_id"]), "message": "Login successful"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[LOGIN ERROR] Exception occurred: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login failed")
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
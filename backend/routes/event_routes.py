@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Optional
+from app.auth import user_for_token_async, token_claims
+from app.events import hub, EVENT_KEEPALIVE_SECONDS
+from app.revocation import revocations
+
+router = APIRouter()
+
+@router.get("/events")
+async def stream(token: Optional[str] = Query(None, description="Access token; EventSource cannot send headers"),
+                 authorization: Optional[str] = Header(None)):
+    """Server-Sent Events stream of the user's task and label changes.
+
+    Events: task.created/updated/deleted, label.created/updated/deleted, and
+    resync when the client fell too far behind and should refetch.
+
+    The token is checked again every EVENT_KEEPALIVE_SECONDS; the stream
+    ends once it is revoked or expires, and the client's reconnect gets 401.
+    """
+    if token is None and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await user_for_token_async(token)
+    claims = token_claims(token)
+    subscription = hub.subscribe(user["_id"])
+
+    async def frames():
+        try:
+            yield b"retry: 3000\n\n"
+            checked = time.monotonic()
+            while True:
+                frame = await subscription.next_frame(EVENT_KEEPALIVE_SECONDS)
+                if time.monotonic() - checked >= EVENT_KEEPALIVE_SECONDS:
+                    if claims["exp"] <= time.time() or await revocations.is_revoked_async(claims):
+                        return
+                    checked = time.monotonic()
+                yield frame
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(frames(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # keep reverse proxies from buffering the stream
+    })
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from models.label_model import LabelCreate
-from app.database import get_label_collection, get_task_collection, create_label, get_labels, assign_labels_to_task
-from app.auth import get_current_user
-from bson import ObjectId
+from models.task_model import parse_deadline
+from app.database import get_async_label_collection, get_async_task_collection, create_label_async, get_labels_json_async, assign_labels_to_task_async, update_task_labels_async, build_id_query
+from database.task_db import task_filters
+from app.auth import get_current_user_async
+from app.versions import list_etag, etag_matches
 
 router = APIRouter()
 
@@ -16,25 +18,75 @@ router = APIRouter()
 class LabelAssignment(BaseModel):
     labels: List[str]
 
+# Same fields as the GET /api/tasks query filters
+class TaskSelector(BaseModel):
+    deadline_from: Optional[str] = None
+    deadline_to: Optional[str] = None
+    completed: Optional[bool] = None
+    priority: Optional[str] = Field(None, pattern="^(High|Medium|Low)$")
+    label: Optional[str] = None
+
+# Model for adding/removing labels across many tasks at once
+class BatchLabelChange(BaseModel):
+    task_ids: Optional[List[str]] = Field(None, max_length=10000)
+    filter: Optional[TaskSelector] = None
+    add: List[str] = []
+    remove: List[str] = []
+
 @router.post("/labels")
-def create(label: LabelCreate, user=Depends(get_current_user), db=Depends(get_label_collection)):
+async def create(label: LabelCreate, user=Depends(get_current_user_async), db=Depends(get_async_label_collection)):
     try:
-        label_id = create_label(label.dict(), user["_id"])
+        label_id = await create_label_async(label.dict(), user["_id"])
         return {"label_id": label_id, "message": "Label created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create label: {str(e)}")
 
 @router.get("/labels")
-def read(user=Depends(get_current_user), db=Depends(get_label_collection)):
+async def read(request: Request, user=Depends(get_current_user_async), db=Depends(get_async_label_collection)):
+    etag = list_etag(user["_id"], "labels")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     try:
-        return get_labels(user["_id"])
+        body = await get_labels_json_async(user["_id"])
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch labels: {str(e)}")
 
+@router.patch("/tasks/labels")
+async def change_many(payload: BatchLabelChange, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
+    """Add and/or remove labels on the given tasks, or on every task matching a filter"""
+    if (payload.task_ids is None) == (payload.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either task_ids or filter")
+    if not payload.add and not payload.remove:
+        raise HTTPException(status_code=400, detail="Nothing to add or remove")
+    if set(payload.add) & set(payload.remove):
+        raise HTTPException(status_code=400, detail="A label cannot be both added and removed")
+
+    if payload.task_ids is not None:
+        query = {"_id": {"$in": [build_id_query(task_id)["_id"] for task_id in payload.task_ids]}}
+    else:
+        selector = payload.filter
+        try:
+            query = task_filters(
+                deadline_from=parse_deadline(selector.deadline_from) if selector.deadline_from else None,
+                deadline_to=parse_deadline(selector.deadline_to) if selector.deadline_to else None,
+                completed=selector.completed,
+                priority=selector.priority,
+                label=selector.label,
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="deadline_from/deadline_to must be ISO dates or datetimes")
+    query["user_id"] = user["_id"]
+    try:
+        return await update_task_labels_async(query, add=payload.add, remove=payload.remove)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to update labels: {str(e)}")
+
 @router.patch("/tasks/{task_id}/labels")
-def assign(task_id: str, payload: LabelAssignment, user=Depends(get_current_user), db=Depends(get_task_collection)):
+async def assign(task_id: str, payload: LabelAssignment, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
     try:
-        assign_labels_to_task(task_id, payload.labels)
+        await assign_labels_to_task_async(task_id, payload.labels, user["_id"])
         return {"message": "Labels assigned successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to assign labels: {str(e)}")
@@ -1,57 +1,173 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pydantic import BaseModel
-from typing import Optional, List
-from models.task_model import TaskCreate
-from database.task_db import create_task, get_tasks, update_task, delete_task
-from app.database import get_task_collection
-from app.auth import get_current_user
+from pydantic import BaseModel, Field, validator
+from typing import Optional, List, Literal, Union
+from typing_extensions import Annotated
+from datetime import datetime
+from models.task_model import TaskCreate, parse_deadline
+from database.task_db import create_task_async, get_tasks_json_async, get_tasks_page_async, update_task_async, delete_task_async, bulk_write_tasks_async, get_task_changes_async, InvalidCursor, ChangesExpired, task_filters
+from app.database import get_async_task_collection
+from app.auth import get_current_user_async
+from app.versions import list_etag, etag_matches
+from app.serialization import dumps
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_BULK_OPERATIONS = 1000
+
 # Task Update model for PUT requests
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     priority: Optional[str] = None
-    deadline: Optional[str] = None
+    deadline: Optional[datetime] = None
     start_time: Optional[str] = None
     end_time: Optional[str] = None
     labels: Optional[List[str]] = None
     completed: Optional[bool] = None
     assignee: Optional[str] = None
 
+    @validator('deadline', pre=True)
+    def convert_deadline_to_datetime(cls, v):
+        """Store deadlines as datetimes, like TaskCreate, so they sort and range-query consistently"""
+        return parse_deadline(v) if v is not None else v
+
+# Bulk operations for POST /tasks/bulk
+class BulkCreate(BaseModel):
+    op: Literal["create"]
+    task: TaskCreate
+
+class BulkUpdate(BaseModel):
+    op: Literal["update"]
+    task_id: str
+    updates: TaskUpdate
+
+class BulkDelete(BaseModel):
+    op: Literal["delete"]
+    task_id: str
+
+class BulkTaskRequest(BaseModel):
+    operations: List[Annotated[Union[BulkCreate, BulkUpdate, BulkDelete], Field(discriminator="op")]] = Field(
+        ..., min_length=1, max_length=MAX_BULK_OPERATIONS
+    )
+
 @router.post("/tasks")
-def create(task: TaskCreate, user=Depends(get_current_user), db=Depends(get_task_collection)):
+async def create(task: TaskCreate, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
     try:
-        task_id = create_task(db, task, user["_id"])
+        task_id = await create_task_async(db, task, user["_id"])
         return {"task_id": task_id, "message": "Task created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create task: {str(e)}")
 
 @router.get("/tasks")
-def read(user=Depends(get_current_user), db=Depends(get_task_collection)):
-    return get_tasks(db, user["_id"])
+async def read(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    deadline_from: Optional[str] = Query(None, description="Only tasks due at or after this date/datetime"),
+    deadline_to: Optional[str] = Query(None, description="Only tasks due before this date/datetime (exclusive)"),
+    completed: Optional[bool] = Query(None),
+    priority: Optional[str] = Query(None, pattern="^(High|Medium|Low)$"),
+    label: Optional[str] = Query(None, description="Only tasks carrying this label"),
+    user=Depends(get_current_user_async),
+    db=Depends(get_async_task_collection),
+):
+    try:
+        filters = task_filters(
+            deadline_from=parse_deadline(deadline_from) if deadline_from else None,
+            deadline_to=parse_deadline(deadline_to) if deadline_to else None,
+            completed=completed,
+            priority=priority,
+            label=label,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="deadline_from/deadline_to must be ISO dates or datetimes")
+
+    # Taken before reading, so a write racing with this request can only make the tag stale
+    etag = list_etag(user["_id"], "tasks")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Without limit/cursor the full (filtered) list is returned, as before
+    if limit is None and cursor is None:
+        body = await get_tasks_json_async(db, user["_id"], filters)
+        return Response(content=body, media_type="application/json", headers=headers)
+    try:
+        tasks, next_cursor = await get_tasks_page_async(db, user["_id"], limit or DEFAULT_PAGE_SIZE, cursor, filters, raw=True)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=dumps(tasks), media_type="application/json", headers=headers)
+
+@router.post("/tasks/bulk")
+async def bulk(request: BulkTaskRequest, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
+    """Apply a batch of create/update/delete operations in order, in one database round trip.
+
+    The whole batch is validated before anything is written; results come
+    back per operation, in request order.
+    """
+    operations = []
+    problems = []
+    for index, item in enumerate(request.operations):
+        if item.op == "create":
+            operations.append({"op": "create", "task": item.task})
+        elif item.op == "update":
+            update_dict = {k: v for k, v in item.updates.dict().items() if v is not None}
+            if not update_dict:
+                problems.append({"index": index, "error": "No updates provided"})
+            operations.append({"op": "update", "task_id": item.task_id, "updates": update_dict})
+        else:
+            operations.append({"op": "delete", "task_id": item.task_id})
+    if problems:
+        raise HTTPException(status_code=400, detail=problems)
+    try:
+        results = await bulk_write_tasks_async(db, operations, user["_id"])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Bulk write failed: {str(e)}")
+    return {"results": results}
+
+@router.get("/tasks/changes")
+async def changes(
+    since: Optional[str] = Query(None, description="watermark from the previous response; omit for a full sync"),
+    user=Depends(get_current_user_async),
+    db=Depends(get_async_task_collection),
+):
+    """Tasks created or updated and ids of tasks deleted after ``since``.
+
+    Store the returned watermark and pass it as ``since`` next time. Changes
+    near the watermark can be sent twice, so apply them idempotently.
+    """
+    try:
+        since_dt = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be a watermark returned by this endpoint")
+    try:
+        return await get_task_changes_async(db, user["_id"], since_dt)
+    except ChangesExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
 
 @router.put("/tasks/{task_id}")
-def update(task_id: str, updates: TaskUpdate, user=Depends(get_current_user), db=Depends(get_task_collection)):
+async def update(task_id: str, updates: TaskUpdate, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
     try:
         # Convert TaskUpdate to dict, removing None values
         update_dict = {k: v for k, v in updates.dict().items() if v is not None}
         if not update_dict:
             return {"message": "No updates provided"}
-        update_task(db, task_id, update_dict)
+        await update_task_async(db, task_id, update_dict, user["_id"])
         return {"message": "Task updated"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to update task: {str(e)}")
 
 @router.delete("/tasks/{task_id}")
-def delete(task_id: str, user=Depends(get_current_user), db=Depends(get_task_collection)):
+async def delete(task_id: str, user=Depends(get_current_user_async), db=Depends(get_async_task_collection)):
     try:
-        delete_task(db, task_id)
+        await delete_task_async(db, task_id, user["_id"])
         return {"message": "Task deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to delete task: {str(e)}")
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Seed the database with a deterministic synthetic dataset.
+
+Generates --users users, --tasks tasks and --labels labels per user. The
+same --seed always gives the same documents, ids included. The data is
+shaped like real use:
+
+- Tasks per user are heavy-tailed (Pareto), so a few users own most of
+  them.
+- Priorities are 20% High, 50% Medium and 30% Low.
+- Deadlines are spread around --start, from 120 days before to 240 days
+  after; most past tasks are completed and most future ones are not.
+- A task has 0 to 3 of its user's labels, and some tasks have a
+  description or a time slot.
+
+Every user has the password --password. The hash is computed once and
+shared.
+
+Documents are written in batches, never through the API:
+
+  --target mongo    insert_many into MONGO_URI (unordered, --workers
+                    batches in flight), then the app's indexes are built
+  --target memory   MockCollection.insert_many into the fallback store.
+                    With --memory-dir (or MEMORY_STORE_DIR) the result is
+                    written as a snapshot the server recovers on start;
+                    without it the load is only timed
+
+Usage: python seed.py --users 10000 --tasks 1000000 [--target memory --memory-dir ./data]
+       python seed.py --target mongo --drop --users 10000 --tasks 1000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+PRIORITY_TABLE = ["High"] * 2 + ["Medium"] * 5 + ["Low"] * 3
+LABEL_COUNT_TABLE = [0] * 4 + [1] * 4 + [2] * 2 + [3]
+LABEL_NAMES = [
+    "work", "personal", "urgent", "errands", "health", "finance", "home", "family",
+    "study", "travel", "shopping", "meetings", "reading", "fitness", "admin", "ideas",
+    "waiting", "someday", "project-x", "garden",
+]
+VERBS = ["Write", "Review", "Call", "Email", "Plan", "Fix", "Book", "Buy", "Clean", "Prepare",
+         "Update", "Schedule", "Pay", "Read", "Organize", "Draft", "Check", "Send", "Renew", "Finish"]
+OBJECTS = ["report", "budget", "dentist", "slides", "groceries", "invoice", "flight", "car service",
+           "quarterly review", "newsletter", "tax return", "team sync", "blog post", "insurance",
+           "birthday gift", "contract", "backlog", "garage", "passport", "onboarding notes"]
+DESCRIPTIONS = [None] * 6 + [
+    "Follow up if there is no answer by Friday.",
+    "Needs the numbers from last month first.",
+    "Ask for a second opinion before sending.",
+    "Keep it short; one page at most.",
+]
+SLOTS = [(None, None)] * 7 + [("09:00", "10:00"), ("13:30", "14:00"), ("16:00", "17:30")]
+DEADLINE_DAYS = range(-120, 241)
+
+
+def mongo_ids(namespace: int) -> Callable[[int], ObjectId]:
+    """counter -> an ObjectId unique per (namespace, counter)"""
+    return lambda counter: ObjectId(f"{namespace:08x}{counter:016x}")
+
+
+def memory_ids(namespace: int) -> Callable[[int], str]:
+    """counter -> a fallback-store id ("mock_id_" and the same 24 hex digits)"""
+    prefix = f"mock_id_{namespace:08x}"
+    return lambda counter: f"{prefix}{counter:016x}"
+
+
+class Dataset:
+    """The users, labels and tasks for one seed; generation is deterministic"""
+
+    def __init__(self, users: int, tasks: int, labels_per_user: int, seed: int, start: datetime,
+                 password_hash: bytes, id_factory: Callable[[int], Callable[[int], Any]]):
+        self.user_count = users
+        self.task_count = tasks
+        self.labels_per_user = min(labels_per_user, len(LABEL_NAMES))
+        self.seed = seed
+        self.start = start
+        self.password_hash = password_hash
+        # namespace -> (counter -> the _id value the target stores)
+        self.id_factory = id_factory
+        make_user_id = id_factory(seed)
+        self.user_ids = [make_user_id(i) for i in range(users)]
+        self.tasks_per_user = self._allocate(random.Random(seed))
+        self.user_labels = self._choose_labels(random.Random(seed + 1))
+
+    def _allocate(self, rng: random.Random) -> List[int]:
+        weights = [rng.paretovariate(1.2) for _ in range(self.user_count)]
+        total = sum(weights)
+        counts = [int(self.task_count * weight / total) for weight in weights]
+        for i in range(self.task_count - sum(counts)):
+            counts[i % self.user_count] += 1
+        return counts
+
+    def _choose_labels(self, rng: random.Random) -> List[List[str]]:
+        return [rng.sample(LABEL_NAMES, self.labels_per_user) for _ in range(self.user_count)]
+
+    def users(self) -> List[Dict[str, Any]]:
+        created = self.start - timedelta(days=365)
+        return [{
+            "_id": user_id,
+            "username": f"user{i}",
+            "email": f"user{i}@seed.test",
+            "password": self.password_hash,
+            "created_at": created,
+        } for i, user_id in enumerate(self.user_ids)]
+
+    def labels(self) -> List[Dict[str, Any]]:
+        make_id = self.id_factory(self.seed + 1)
+        docs = []
+        for user_id, names in zip(self.user_ids, self.user_labels):
+            for name in names:
+                docs.append({"_id": make_id(len(docs)), "name": name, "user_id": str(user_id)})
+        return docs
+
+    def task_batches(self, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        getrandbits = random.Random(self.seed + 2).getrandbits
+        make_id = self.id_factory(self.seed + 2)
+        # Shared immutable values; picking from tables is much cheaper than
+        # building a datetime or string per task
+        deadlines = [self.start + timedelta(days=day) for day in DEADLINE_DAYS]
+        created_at = [deadline - timedelta(days=14) for deadline in deadlines]
+        past = DEADLINE_DAYS.index(0)
+        titles = [f"{verb} {obj}" for verb in VERBS for obj in OBJECTS]
+        days, slots, descriptions = len(deadlines), len(SLOTS), len(DESCRIPTIONS)
+        title_count, label_counts = len(titles), len(LABEL_COUNT_TABLE)
+
+        batch: List[Dict[str, Any]] = []
+        counter = 0
+        for user_id, count, user_labels in zip(self.user_ids, self.tasks_per_user, self.user_labels):
+            user_id = str(user_id)
+            # Every rotation of the user's labels; a task takes a prefix of one
+            rotations = [user_labels[i:] + user_labels[:i] for i in range(len(user_labels))] or [[]]
+            for _ in range(count):
+                # One 64-bit draw, split into every choice the task needs
+                bits, day = divmod(getrandbits(64), days)
+                bits, slot = divmod(bits, slots)
+                bits, title = divmod(bits, title_count)
+                bits, description = divmod(bits, descriptions)
+                bits, priority = divmod(bits, len(PRIORITY_TABLE))
+                bits, label_count = divmod(bits, label_counts)
+                bits, rotation = divmod(bits, len(rotations))
+                start_time, end_time = SLOTS[slot]
+                batch.append({
+                    "_id": make_id(counter),
+                    "title": titles[title],
+                    "description": DESCRIPTIONS[description],
+                    "priority": PRIORITY_TABLE[priority],
+                    "deadline": deadlines[day],
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "labels": rotations[rotation][:LABEL_COUNT_TABLE[label_count]],
+                    "completed": bits % 10 < (8 if day < past else 1),
+                    "user_id": user_id,
+                    "created_at": created_at[day],
+                    "updated_at": created_at[day],
+                })
+                counter += 1
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def seed_memory(dataset: Dataset, batch_size: int) -> Dict[str, int]:
+    """Load the dataset into the fallback store; snapshot it if MEMORY_STORE_DIR is set"""
+    from app import database
+
+    database._use_memory_store()
+    storage = database.in_memory_storage
+    journal = database.memory_store_journal
+    # Bulk loads bypass the log: one snapshot at the end covers them
+    for collection in storage.values():
+        collection.journal = None
+    counts = {"users": 0, "labels": 0, "tasks": 0}
+    storage["users"].insert_many(dataset.users())
+    counts["users"] = dataset.user_count
+    labels = dataset.labels()
+    storage["labels"].insert_many(labels)
+    counts["labels"] = len(labels)
+    for batch in dataset.task_batches(batch_size):
+        storage["tasks"].insert_many(batch)
+        counts["tasks"] += len(batch)
+    if journal is not None:
+        for collection in storage.values():
+            collection.journal = journal
+        started = time.perf_counter()
+        journal.snapshot()
+        journal.close()
+        print(f"Snapshot written to {journal.directory} in {time.perf_counter() - started:.1f}s")
+    return counts
+
+
+def seed_mongo(dataset: Dataset, batch_size: int, workers: int, drop: bool) -> Dict[str, int]:
+    from app.database import _connect_mongodb
+    from app.indexes import ensure_indexes
+
+    client = _connect_mongodb()
+    db = client["todo_app"]
+    if drop:
+        for name in ("users", "tasks", "labels", "task_tombstones"):
+            db[name].drop()
+    counts = {"users": 0, "labels": 0, "tasks": 0}
+    db["users"].insert_many(dataset.users(), ordered=False)
+    counts["users"] = dataset.user_count
+    labels = dataset.labels()
+    db["labels"].insert_many(labels, ordered=False)
+    counts["labels"] = len(labels)
+
+    # Generating documents holds the GIL while insert_many mostly waits on
+    # the server, so a few batches in flight keep both busy
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = []
+        for batch in dataset.task_batches(batch_size):
+            in_flight.append(pool.submit(db["tasks"].insert_many, batch, ordered=False))
+            counts["tasks"] += len(batch)
+            if len(in_flight) >= workers * 2:
+                in_flight.pop(0).result()
+        for future in in_flight:
+            future.result()
+
+    started = time.perf_counter()
+    ensure_indexes(db)
+    print(f"Indexes built in {time.perf_counter() - started:.1f}s")
+    client.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("memory", "mongo"), default="memory")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--tasks", type=int, default=1_000_000, help="total tasks across all users")
+    parser.add_argument("--labels", type=int, default=5, help="labels per user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start", default="2025-01-01", help="date deadlines are spread around")
+    parser.add_argument("--password", default="password123", help="password of every seeded user")
+    parser.add_argument("--bcrypt-cost", type=int, default=None, help="default: the app's DEFAULT_COST")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=4, help="mongo: batches inserted concurrently")
+    parser.add_argument("--drop", action="store_true",
+                        help="mongo: drop users, tasks and labels first; memory: discard the snapshot and log in --memory-dir")
+    parser.add_argument("--memory-dir", help="memory: snapshot directory (default MEMORY_STORE_DIR)")
+    args = parser.parse_args()
+
+    if args.users < 1:
+        parser.error("--users must be at least 1")
+    if args.target == "memory" and args.memory_dir:
+        os.environ["MEMORY_STORE_DIR"] = args.memory_dir  # read when app.database is imported
+    memory_dir = os.getenv("MEMORY_STORE_DIR")
+    if args.target == "memory" and args.drop and memory_dir and os.path.isdir(memory_dir):
+        from app.persistence import SEGMENT_PREFIX, SNAPSHOT_FILE
+        for name in os.listdir(memory_dir):
+            if name == SNAPSHOT_FILE or name.startswith(SEGMENT_PREFIX):
+                os.remove(os.path.join(memory_dir, name))
+
+    import bcrypt
+    from app.hashing import DEFAULT_COST
+
+    cost = args.bcrypt_cost or DEFAULT_COST
+    password_hash = bcrypt.hashpw(args.password.encode("utf-8")[:72], bcrypt.gensalt(rounds=cost))
+    dataset = Dataset(args.users, args.tasks, args.labels, args.seed, datetime.fromisoformat(args.start),
+                      password_hash, mongo_ids if args.target == "mongo" else memory_ids)
+
+    started = time.perf_counter()
+    # Every document built here stays alive until it is written; the cyclic
+    # GC would only rescan the growing heap over and over
+    gc.disable()
+    try:
+        if args.target == "mongo":
+            counts = seed_mongo(dataset, args.batch_size, args.workers, args.drop)
+        else:
+            counts = seed_memory(dataset, args.batch_size)
+    except BulkWriteError as e:
+        first = e.details["writeErrors"][0]["errmsg"]
+        print(f"FAIL the dataset is already there ({first}); rerun with --drop")
+        return 1
+    finally:
+        gc.enable()
+    elapsed = time.perf_counter() - started
+
+    print(f"Seeded {counts['users']} users, {counts['labels']} labels and {counts['tasks']} tasks "
+          f"into {args.target} in {elapsed:.1f}s ({counts['tasks'] / elapsed:,.0f} tasks/s)")
+    print(f"Log in as user0@seed.test ... user{args.users - 1}@seed.test with password {args.password!r}")
+    if args.target == "memory" and not memory_dir:
+        print("Not persisted: pass --memory-dir (or set MEMORY_STORE_DIR) so the server loads it on start")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
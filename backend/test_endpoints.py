@@ -65,6 +65,22 @@ def test_protected_endpoint(token):
         print(f"Protected endpoint test failed: {e}")
         return False
 
+def test_changes_with_offset(token):
+    """Test the changes feed with a timezone-aware watermark"""
+    if not token:
+        print("No token available for changes test")
+        return False
+
+    try:
+        headers = {"Authorization": f"Bearer {token}"}
+        params = {"since": "2026-10-18T00:00:00+00:00"}
+        response = requests.get(f"{BASE_URL}/api/tasks/changes", headers=headers, params=params)
+        print(f"Changes with offset: {response.status_code} - {response.json()}")
+        return response.status_code in (200, 410)
+    except Exception as e:
+        print(f"Changes test failed: {e}")
+        return False
+
 def main():
     print("Testing backend endpoints...")
     print("=" * 50)
@@ -84,8 +100,9 @@ def main():
     # Test protected endpoint
     if token:
         protected_ok = test_protected_endpoint(token)
+        changes_ok = test_changes_with_offset(token)
     else:
-        protected_ok = False
+        protected_ok = changes_ok = False
     print()
     
     # Summary
@@ -95,8 +112,9 @@ def main():
     print(f"Signup: {'PASS' if signup_ok else 'FAIL'}")
     print(f"Login: {'PASS' if token else 'FAIL'}")
     print(f"Protected endpoint: {'PASS' if protected_ok else 'FAIL'}")
+    print(f"Changes with offset: {'PASS' if changes_ok else 'FAIL'}")
     
-    if all([health_ok, signup_ok, token, protected_ok]):
+    if all([health_ok, signup_ok, token, protected_ok, changes_ok]):
         print("\nAll tests passed! Your backend is working correctly.")
     else:
         print("\nSome tests failed. Check the error messages above.")
@@ -0,0 +1,54 @@
+"""
+The app driven in-process through FastAPI's TestClient, against a fresh
+in-memory store for every test.
+"""
+
+import os
+import sys
+import uuid
+
+# Read at import time by the app modules, so set before importing them
+os.environ.pop("MEMORY_STORE_DIR", None)
+os.environ["DB_HEALTH_CHECK_INTERVAL"] = "0"  # never fail over to/from MongoDB
+os.environ["PASSWORD_HASH_WORKERS"] = "0"  # hash in a thread, no process pool
+os.environ["PASSWORD_HASH_COST"] = "4"
+os.environ["AUTH_RATE_LIMIT_IP_PER_MINUTE"] = "0"
+os.environ["AUTH_RATE_LIMIT_EMAIL_PER_MINUTE"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+
+PASSWORD = "password123"
+
+
+@pytest.fixture
+def client():
+    # Startup sees the store already chosen and never tries MongoDB
+    database.in_memory_storage.clear()
+    database._use_memory_store()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def signup(client):
+    """Create a user and log in; returns (token, user_id)"""
+    def signup(name: str = "user"):
+        email = f"{name}-{uuid.uuid4().hex[:8]}@example.com"
+        response = client.post("/signup", json={"username": name, "email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        response = client.post("/login", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return response.json()["access_token"], response.json()["user_id"]
+    return signup
+
+
+@pytest.fixture
+def headers(signup):
+    token, _ = signup()
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,62 @@
+import time
+
+from jose import jwt
+
+from app.auth import ALGORITHM, SECRET_KEY, create_access_token
+
+
+def test_token_works_until_logout(client, signup):
+    token, _ = signup()
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/tasks", headers=headers).status_code == 200
+
+    assert client.post("/logout", headers=headers).status_code == 200
+
+    response = client.get("/api/tasks", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+
+
+def test_logout_all_revokes_earlier_tokens_only(client, signup):
+    token, user_id = signup()
+    headers = {"Authorization": f"Bearer {token}"}
+    other = create_access_token({"user_id": user_id, "email": "other@example.com"})
+
+    assert client.post("/logout-all", headers=headers).status_code == 200
+    time.sleep(0.01)  # iat is fractional, but give the clock a tick
+    fresh = create_access_token({"user_id": user_id, "email": "other@example.com"})
+
+    for revoked in (token, other):
+        response = client.get("/api/tasks", headers={"Authorization": f"Bearer {revoked}"})
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+    assert client.get("/api/tasks", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200
+
+
+def test_token_without_jti_is_rejected(client, signup):
+    _, user_id = signup()
+    # Signed with the right key, as tokens minted before revocation existed were
+    legacy = jwt.encode({"user_id": user_id, "sub": "x@example.com", "exp": int(time.time()) + 60},
+                        SECRET_KEY, algorithm=ALGORITHM)
+
+    response = client.get("/api/tasks", headers={"Authorization": f"Bearer {legacy}"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid token: missing jti"
+
+
+def test_forged_token_is_rejected(client, signup):
+    _, user_id = signup()
+    forged = jwt.encode({"user_id": user_id, "jti": "x", "iat": time.time(), "exp": int(time.time()) + 60},
+                        "not-the-secret", algorithm=ALGORITHM)
+
+    response = client.get("/api/tasks", headers={"Authorization": f"Bearer {forged}"})
+    assert response.status_code == 401
+    assert response.json()["detail"].startswith("Invalid token:")
+
+
+def test_unknown_user_is_404(client):
+    token = create_access_token({"user_id": "mock_id_000000000000000000000000", "email": "gone@example.com"})
+
+    response = client.get("/api/tasks", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
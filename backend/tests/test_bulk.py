@@ -0,0 +1,72 @@
+def _create(client, headers, title):
+    response = client.post("/api/tasks", headers=headers,
+                           json={"title": title, "priority": "Low", "deadline": "2025-01-01"})
+    assert response.status_code == 200, response.text
+    return response.json()["task_id"]
+
+
+def _bulk(client, headers, operations):
+    return client.post("/api/tasks/bulk", headers=headers, json={"operations": operations})
+
+
+def test_results_come_back_per_operation_in_order(client, headers):
+    keep = _create(client, headers, "keep")
+    drop = _create(client, headers, "drop")
+    new_task = {"title": "new", "priority": "High", "deadline": "2025-02-01"}
+
+    response = _bulk(client, headers, [
+        {"op": "create", "task": new_task},
+        {"op": "update", "task_id": keep, "updates": {"completed": True}},
+        {"op": "delete", "task_id": drop},
+        {"op": "delete", "task_id": drop},
+        {"op": "update", "task_id": "mock_id_000000000000000000000000", "updates": {"title": "x"}},
+    ])
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(r["index"], r["op"], r["status"]) for r in results] == [
+        (0, "create", "created"),
+        (1, "update", "updated"),
+        (2, "delete", "deleted"),
+        (3, "delete", "not_found"),  # already deleted earlier in the batch
+        (4, "update", "not_found"),
+    ]
+    assert results[1]["task_id"] == keep and results[2]["task_id"] == drop
+
+    tasks = {task["_id"]: task for task in client.get("/api/tasks", headers=headers).json()}
+    assert set(tasks) == {keep, results[0]["task_id"]}
+    assert tasks[keep]["completed"] is True
+    assert tasks[results[0]["task_id"]]["title"] == "new"
+
+
+def test_other_users_tasks_are_not_found(client, signup, headers):
+    token, _ = signup("other")
+    theirs = _create(client, {"Authorization": f"Bearer {token}"}, "theirs")
+
+    response = _bulk(client, headers, [
+        {"op": "update", "task_id": theirs, "updates": {"title": "mine now"}},
+        {"op": "delete", "task_id": theirs},
+    ])
+
+    assert [r["status"] for r in response.json()["results"]] == ["not_found", "not_found"]
+    other_tasks = client.get("/api/tasks", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [task["title"] for task in other_tasks] == ["theirs"]
+
+
+def test_invalid_batch_is_rejected_before_any_write(client, headers):
+    task_id = _create(client, headers, "untouched")
+
+    response = _bulk(client, headers, [
+        {"op": "delete", "task_id": task_id},
+        {"op": "update", "task_id": task_id, "updates": {}},
+    ])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == [{"index": 1, "error": "No updates provided"}]
+    assert [task["_id"] for task in client.get("/api/tasks", headers=headers).json()] == [task_id]
+
+
+def test_unknown_op_fails_validation(client, headers):
+    response = _bulk(client, headers, [{"op": "upsert", "task_id": "x"}])
+
+    assert response.status_code == 400  # the app answers validation errors with 400
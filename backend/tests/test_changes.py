@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from app import database
+from app.indexes import TASK_TOMBSTONE_RETENTION_SECONDS
+
+
+def _create(client, headers, title):
+    response = client.post("/api/tasks", headers=headers,
+                           json={"title": title, "priority": "Low", "deadline": "2025-01-01"})
+    assert response.status_code == 200, response.text
+    return response.json()["task_id"]
+
+
+def _changes(client, headers, since=None):
+    return client.get("/api/tasks/changes", headers=headers, params={"since": since} if since else {})
+
+
+def test_full_sync_then_deltas_with_tombstones(client, headers):
+    kept = _create(client, headers, "kept")
+    deleted = _create(client, headers, "deleted")
+    bulk_deleted = _create(client, headers, "bulk deleted")
+
+    full = _changes(client, headers).json()
+    assert {task["_id"] for task in full["changed"]} == {kept, deleted, bulk_deleted}
+    assert full["deleted"] == []
+
+    assert client.put(f"/api/tasks/{kept}", headers=headers, json={"title": "renamed"}).status_code == 200
+    assert client.delete(f"/api/tasks/{deleted}", headers=headers).status_code == 200
+    response = client.post("/api/tasks/bulk", headers=headers,
+                           json={"operations": [{"op": "delete", "task_id": bulk_deleted}]})
+    assert response.status_code == 200
+
+    delta = _changes(client, headers, full["watermark"]).json()
+    changed = {task["_id"]: task for task in delta["changed"]}
+    assert changed[kept]["title"] == "renamed"
+    assert deleted not in changed and bulk_deleted not in changed
+    assert sorted(delta["deleted"]) == sorted([deleted, bulk_deleted])
+    assert delta["watermark"] >= full["watermark"]
+
+
+def test_tombstones_are_per_user(client, signup, headers):
+    token, _ = signup("other")
+    other = {"Authorization": f"Bearer {token}"}
+    watermark = _changes(client, other).json()["watermark"]
+
+    task_id = _create(client, headers, "mine")
+    client.delete(f"/api/tasks/{task_id}", headers=headers)
+
+    assert _changes(client, other, watermark).json()["deleted"] == []
+
+
+def test_watermark_older_than_retention_is_410(client, headers):
+    since = datetime.utcnow() - timedelta(seconds=TASK_TOMBSTONE_RETENTION_SECONDS + 60)
+
+    response = _changes(client, headers, since.isoformat())
+
+    assert response.status_code == 410
+
+
+def test_expired_tombstones_are_dropped(client, signup):
+    token, user_id = signup()
+    headers = {"Authorization": f"Bearer {token}"}
+    tombstones = database.in_memory_storage["task_tombstones"]
+    expired = datetime.utcnow() - timedelta(seconds=TASK_TOMBSTONE_RETENTION_SECONDS + 60)
+    tombstones.insert_one({"task_id": "old", "user_id": user_id, "deleted_at": expired})
+    since = datetime.utcnow() - timedelta(seconds=60)
+
+    response = _changes(client, headers, since.isoformat())
+
+    assert response.status_code == 200
+    assert response.json()["deleted"] == []
+    assert tombstones.count_documents({"user_id": user_id}) == 0
+
+
+def test_offset_aware_watermark_is_read_as_utc(client, headers):
+    full = _changes(client, headers).json()
+    task_id = _create(client, headers, "new")
+    # The same instant as the watermark, two hours east of UTC
+    since = (datetime.fromisoformat(full["watermark"]).replace(tzinfo=timezone.utc)
+             .astimezone(timezone(timedelta(hours=2))))
+
+    delta = _changes(client, headers, since.isoformat()).json()
+
+    assert [task["_id"] for task in delta["changed"]] == [task_id]
+
+
+def test_malformed_watermark_is_400(client, headers):
+    assert _changes(client, headers, "yesterday").status_code == 400
@@ -0,0 +1,69 @@
+def _create(client, headers, title, deadline, **fields):
+    response = client.post("/api/tasks", headers=headers,
+                           json={"title": title, "priority": "Medium", "deadline": deadline, **fields})
+    assert response.status_code == 200, response.text
+    return response.json()["task_id"]
+
+
+def _pages(client, headers, limit, **params):
+    pages = []
+    cursor = None
+    while True:
+        query = {"limit": limit, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/tasks", headers=headers, params=query)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_pages_split_equal_deadlines_without_gaps_or_repeats(client, headers):
+    # Runs of 7 equal deadlines, so most page boundaries fall inside a run
+    ids = {_create(client, headers, f"task {i}", f"2025-01-0{1 + i % 3}") for i in range(21)}
+
+    pages = _pages(client, headers, limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 4, 4, 4, 1]
+    tasks = [task for page in pages for task in page]
+    assert len(tasks) == len(ids)
+    assert {task["_id"] for task in tasks} == ids
+    assert [(task["deadline"], task["_id"]) for task in tasks] == sorted((task["deadline"], task["_id"]) for task in tasks)
+
+
+def test_exact_multiple_of_the_page_size_ends_without_a_cursor(client, headers):
+    for i in range(6):
+        _create(client, headers, f"task {i}", "2025-03-01")
+
+    pages = _pages(client, headers, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3]
+
+
+def test_pages_respect_filters(client, headers):
+    for i in range(10):
+        _create(client, headers, f"task {i}", "2025-02-01", completed=i % 2 == 0)
+
+    pages = _pages(client, headers, limit=2, completed="true")
+
+    tasks = [task for page in pages for task in page]
+    assert len(tasks) == 5
+    assert all(task["completed"] for task in tasks)
+
+
+def test_tasks_of_other_users_are_not_paged(client, signup, headers):
+    token, _ = signup("other")
+    _create(client, {"Authorization": f"Bearer {token}"}, "not mine", "2025-01-01")
+    mine = _create(client, headers, "mine", "2025-01-01")
+
+    pages = _pages(client, headers, limit=10)
+
+    assert [task["_id"] for page in pages for task in page] == [mine]
+
+
+def test_invalid_cursor_is_400(client, headers):
+    response = client.get("/api/tasks", headers=headers, params={"limit": 2, "cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
@@ -0,0 +1,83 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from app.memory_store import MockCollection
+from app.persistence import SEGMENT_PREFIX, SNAPSHOT_FILE, MemoryStoreJournal
+
+
+def _collections():
+    # Shaped like the app's (app.database._use_memory_store)
+    return {
+        "users": MockCollection("users", indexes=("email",)),
+        "tasks": MockCollection("tasks", indexes=(), shard_key="user_id", order_by="deadline"),
+    }
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    journals = []
+
+    def open_store():
+        collections = _collections()
+        journal = MemoryStoreJournal(str(tmp_path), group_commit_ms=0, sync_commit=True)
+        journal.attach(collections)
+        journals.append(journal)
+        return collections, journal
+
+    yield open_store
+    for journal in journals:
+        journal.close()
+
+
+def _task(user_id, n, deadline):
+    return {"user_id": user_id, "title": f"task {n}", "deadline": deadline}
+
+
+def test_snapshot_plus_replayed_log(tmp_path, open_store):
+    collections, journal = open_store()
+    users, tasks = collections["users"], collections["tasks"]
+    users.insert_one({"email": "a@example.com", "password": b"\x00hash", "created_at": datetime(2024, 1, 2, 3, 4, 5)})
+    tasks.insert_many([_task("u1", n, datetime(2025, 1, 1 + n % 3)) for n in range(30)])
+    journal.snapshot()
+    # After the snapshot: only in the log
+    tasks.insert_one(_task("u1", 30, datetime(2024, 12, 31)))
+    tasks.update_one({"title": "task 1"}, {"$set": {"deadline": datetime(2026, 1, 1), "done": True}})
+    tasks.delete_one({"title": "task 2"})
+    users.update_one({"email": "a@example.com"}, {"$set": {"email": "b@example.com"}})
+    expected_order = [doc["title"] for doc in tasks.find_ordered({"user_id": "u1"})]
+    journal.close()
+    assert (tmp_path / SNAPSHOT_FILE).exists()
+
+    collections, _ = open_store()
+    users, tasks = collections["users"], collections["tasks"]
+
+    assert tasks.count_documents({}) == 30
+    assert tasks.find_one({"title": "task 2"}) is None
+    assert tasks.find_one({"title": "task 1"})["done"] is True
+    assert [doc["title"] for doc in tasks.find_ordered({"user_id": "u1"})] == expected_order
+    assert expected_order[0] == "task 30" and expected_order[-1] == "task 1"
+    user = users.find_one({"email": "b@example.com"})
+    assert user["password"] == b"\x00hash"
+    assert user["created_at"] == datetime(2024, 1, 2, 3, 4, 5)
+    assert users.find_one({"email": "a@example.com"}) is None
+
+
+def test_torn_tail_is_ignored(tmp_path, open_store):
+    collections, journal = open_store()
+    collections["tasks"].insert_one(_task("u1", 0, datetime(2025, 1, 1)))
+    collections["tasks"].insert_one(_task("u1", 1, datetime(2025, 1, 2)))
+    journal.close()
+    segment = max(name for name in os.listdir(tmp_path) if name.startswith(SEGMENT_PREFIX))
+    with open(tmp_path / segment, "a", encoding="utf-8") as f:
+        f.write('{"c":"tasks","op":"i","id":"mock_id_x","doc":{"_id":"mock_id_x","ti')  # crashed mid-write
+
+    collections, journal = open_store()
+    assert sorted(doc["title"] for doc in collections["tasks"].find({})) == ["task 0", "task 1"]
+
+    # Writes after recovery land in a new segment and survive the next restart
+    collections["tasks"].insert_one(_task("u1", 2, datetime(2025, 1, 3)))
+    journal.close()
+    collections, _ = open_store()
+    assert sorted(doc["title"] for doc in collections["tasks"].find({})) == ["task 0", "task 1", "task 2"]
@@ -6,6 +6,7 @@ import BottomNav from "./BottomNav";
 import CelebrationEffect from "./CelebrationEffect";
 import StarsCelebration from "./StarsCelebration";
 import HamburgerNav from "./HamburgerNav";
+import { logout } from "../utils/api";
 
 interface Task {
   _id: string;
@@ -228,7 +229,7 @@ export default function DashboardContent() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem("token");
+    logout();
     localStorage.removeItem("user_id");
     router.push("/login");
   };
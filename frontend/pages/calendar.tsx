@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
+import { logout } from "../utils/api";
 
 interface Task {
   _id: string;
@@ -52,13 +53,28 @@ export default function Calendar() {
     }
 
     setToken(storedToken);
-    fetchTasks(storedToken);
   }, [router]);
 
-  const fetchTasks = async (authToken: string) => {
+  useEffect(() => {
+    // Only the visible month is requested; refetch when the month changes
+    if (token) {
+      fetchTasks(token, currentDate);
+    }
+  }, [token, currentDate]);
+
+  const toDateParam = (date: Date) => {
+    const month = String(date.getMonth() + 1).padStart(2, "0");
+    return `${date.getFullYear()}-${month}-01`;
+  };
+
+  const fetchTasks = async (authToken: string, month: Date) => {
     try {
       setLoading(true);
-      const res = await fetch("http://localhost:8000/api/tasks", {
+      const params = new URLSearchParams({
+        deadline_from: toDateParam(month),
+        deadline_to: toDateParam(new Date(month.getFullYear(), month.getMonth() + 1, 1)),
+      });
+      const res = await fetch(`http://localhost:8000/api/tasks?${params}`, {
         headers: { Authorization: `Bearer ${authToken}` },
       });
       
@@ -155,7 +171,7 @@ export default function Calendar() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem("token");
+    logout();
     router.push("/login");
   };
 
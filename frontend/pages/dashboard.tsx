@@ -5,6 +5,7 @@ import BottomNav from "../components/BottomNav";
 import CelebrationEffect from "../components/CelebrationEffect";
 import StarsCelebration from "../components/StarsCelebration";
 import HamburgerNav from "../components/HamburgerNav";
+import { logout } from "../utils/api";
 
 interface Task {
   _id: string;
@@ -128,6 +129,30 @@ export default function Dashboard() {
     }
   }, []);
 
+  useEffect(() => {
+    // Refetch when tasks or labels change elsewhere (another tab, device or bulk import)
+    if (!token) return;
+    const events = new EventSource(`http://localhost:8000/api/events?token=${encodeURIComponent(token)}`);
+    // Coalesce bursts (e.g. a bulk import) into one refetch
+    const timers: { [key: string]: ReturnType<typeof setTimeout> | undefined } = {};
+    const debounced = (key: string, fn: () => void) => () => {
+      clearTimeout(timers[key]);
+      timers[key] = setTimeout(fn, 200);
+    };
+    const refetchTasks = debounced("tasks", () => fetchTasks(token));
+    const refetchLabels = debounced("labels", () => fetchLabels(token));
+    ["task.created", "task.updated", "task.deleted"].forEach((type) => events.addEventListener(type, refetchTasks));
+    ["label.created", "label.updated", "label.deleted"].forEach((type) => events.addEventListener(type, refetchLabels));
+    events.addEventListener("resync", () => {
+      refetchTasks();
+      refetchLabels();
+    });
+    return () => {
+      events.close();
+      Object.values(timers).forEach((timer) => clearTimeout(timer));
+    };
+  }, [token]);
+
   const fetchTasks = async (authToken: string) => {
     try {
       setLoading(true);
@@ -405,7 +430,7 @@ export default function Dashboard() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem("token");
+    logout();
     window.location.href = "/login";
   };
 
@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
+import { logout } from "../utils/api";
 
 interface UserProfile {
   username: string;
@@ -83,7 +84,7 @@ export default function Profile() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem("token");
+    logout();
     localStorage.removeItem("userProfile");
     router.push("/login");
   };
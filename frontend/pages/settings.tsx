@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
+import { logout } from "../utils/api";
 
 interface Settings {
   theme: "light" | "dark";
@@ -82,7 +83,7 @@ export default function Settings() {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem("token");
+    logout();
     localStorage.removeItem("appSettings");
     localStorage.removeItem("userProfile");
     router.push("/login");
@@ -1,5 +1,19 @@
 const API_BASE_URL = 'http://localhost:8000';
 
+// Forget the stored token and revoke it on the server; no need to wait for that
+export const logout = () => {
+  const token = localStorage.getItem('token');
+  if (token) {
+    fetch(`${API_BASE_URL}/logout`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    }).catch(() => {});
+  }
+  localStorage.removeItem('token');
+};
+
 export const api = {
   // Auth endpoints
   login: async (email: string, password: string) => {